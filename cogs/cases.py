@@ -0,0 +1,185 @@
+from typing import Optional
+
+import discord
+from discord.ext import commands
+from utils import Embed as CustomEmbed
+from utils.cases import MAX_REASON_EDIT
+from utils.pagination import KeysetPages, KeysetPageSource
+from utils.utils import title_format
+
+
+def format_case(case) -> str:
+    return (
+        f"<t:{int(case['created_at'].timestamp())}:f> "
+        f"User: <@{case['user_id']}> By: <@{case['moderator_id']}>\n"
+        f"Reason: {(case['reason'] or 'None given')[:200]}"
+    )
+
+
+class CaseSource(KeysetPageSource):
+    """A guild's cases for one user or moderator, newest first, keyed on case_id"""
+
+    def __init__(
+        self,
+        bot,
+        guild_id: int,
+        column: str,
+        id: int,
+        *,
+        title: str,
+        header: Optional[str] = None,
+    ):
+        super().__init__(per_page=5)
+        self.bot = bot
+        self.guild_id = guild_id
+        self.column = column
+        self.id = id
+        self.title = title
+        self.header = header
+
+    async def fetch(self, after, limit):
+        return await self.bot.db.fetch(
+            f"""
+            SELECT * FROM cases
+            WHERE guild_id = $1 AND {self.column} = $2 AND case_id < $3
+            ORDER BY case_id DESC
+            LIMIT $4
+            """,
+            self.guild_id,
+            self.id,
+            after if after is not None else 2 ** 31 - 1,
+            limit,
+        )
+
+    def key(self, entry):
+        return entry["case_id"]
+
+    def format_page(self, menu, entries):
+        embed = CustomEmbed(title=self.title, description=self.header)
+
+        if not entries:
+            embed.add_field(name="Cases", value="Nothing has been recorded.")
+
+        for case in entries:
+            embed.add_field(
+                name=f"#{case['case_id']} {title_format(case['action'])}",
+                value=format_case(case),
+                inline=False,
+            )
+
+        max_pages = self.get_max_pages()
+        embed.set_footer(text=f"Page {menu.current_page + 1} / {max_pages or '?'}")
+
+        return embed
+
+
+class Cases(commands.Cog):
+    """Looking up and editing the moderation cases of a server"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_check(self, ctx):
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+
+        permissions = ctx.author.guild_permissions
+
+        if not (
+            permissions.kick_members
+            or permissions.ban_members
+            or permissions.manage_roles
+        ):
+            # Any one of them will do, the error lists them all.
+            raise commands.MissingPermissions(
+                ["kick_members", "ban_members", "manage_roles"]
+            )
+
+        return True
+
+    @commands.command(name="case")
+    async def _case(self, ctx, case_id: int):
+        """Shows a case by its number"""
+        case = await self.bot.cases.get(ctx.guild.id, case_id)
+
+        if case is None:
+            raise commands.BadArgument(f"There is no case #{case_id}.")
+
+        embed = CustomEmbed(
+            title=f"Case #{case_id} {title_format(case['action'])}",
+            description=format_case(case),
+        )
+
+        if case["edited_at"] is not None:
+            embed.set_footer(text="Reason edited")
+            embed.timestamp = case["edited_at"]
+
+        await ctx.reply(embed=embed)
+
+    @commands.command()
+    async def history(self, ctx, *, user: discord.User):
+        """Shows every case recorded against a user, newest first"""
+        menu = KeysetPages(
+            CaseSource(
+                self.bot, ctx.guild.id, "user_id", user.id, title=f"History of {user}"
+            )
+        )
+        await menu.start(ctx)
+
+    @commands.command()
+    async def modstats(self, ctx, *, moderator: discord.User = None):
+        """Shows how many actions a moderator took and the cases they made"""
+        moderator = moderator or ctx.author
+        stats = await self.bot.cases.stats(ctx.guild.id, moderator.id)
+
+        header = "\n".join(
+            f"{title_format(row['action'])}: {row['total']} ({row['week']} this week)"
+            for row in stats
+        )
+
+        menu = KeysetPages(
+            CaseSource(
+                self.bot,
+                ctx.guild.id,
+                "moderator_id",
+                moderator.id,
+                title=f"Moderation by {moderator}",
+                header=header or None,
+            )
+        )
+        await menu.start(ctx)
+
+    @commands.command()
+    async def reason(self, ctx, case_ids: commands.Greedy[int], *, reason: str):
+        """Sets the reason of one or more cases. Eg: `reason 12 13 14 Raid`"""
+        if not case_ids:
+            raise commands.BadArgument("Give at least one case number.")
+
+        if len(case_ids) > MAX_REASON_EDIT:
+            raise commands.BadArgument(
+                f"I can only edit {MAX_REASON_EDIT} cases at once."
+            )
+
+        edited = await self.bot.cases.edit_reasons(ctx.guild.id, case_ids, reason)
+
+        if not edited:
+            raise commands.BadArgument("None of those cases exist.")
+
+        missing = sorted(set(case_ids) - set(edited))
+
+        await ctx.reply(
+            embed=CustomEmbed(
+                description=(
+                    f"Set the reason of {len(edited)} case(s) to `{reason}`."
+                    + (
+                        f"\nThese don't exist: {', '.join(map(str, missing))}"
+                        if missing
+                        else ""
+                    )
+                )
+            )
+        )
+
+
+def setup(bot):
+    bot.add_cog(Cases(bot))
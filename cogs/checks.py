@@ -1,17 +1,43 @@
-from discord.ext import commands
+from discord.ext import commands, tasks
 from utils.CustomErrors import Blacklisted
 
+PRUNE_INTERVAL = 1
+
 
 class Checks(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         bot.add_check(self.blacklisted)
+        self.prune_blacklist.start()
+
+    def cog_unload(self):
+        self.bot.remove_check(self.blacklisted)
+        self.prune_blacklist.cancel()
 
     async def blacklisted(self, ctx):
-        if reason := ctx.bot.blacklisted.get(ctx.author.id) is not None:
-            raise Blacklisted(f"You are blacklisted! Reason: `{reason}`")
+        # Messages are already dropped at ingress, this catches direct invokes.
+        if (entry := ctx.bot.blacklist.get(ctx.author.id)) is not None:
+            raise Blacklisted(f"You are blacklisted! Reason: `{entry.reason}`")
+
+        if ctx.guild and (entry := ctx.bot.blacklist.get(ctx.guild.id)) is not None:
+            raise Blacklisted(f"This guild is blacklisted! Reason: `{entry.reason}`")
+
         return True
 
+    @tasks.loop(hours=PRUNE_INTERVAL)
+    async def prune_blacklist(self):
+        """Deletes expired temporary blacklists, they're only skipped in memory"""
+        records = await self.bot.db.fetch(
+            "DELETE FROM blacklist WHERE expires_at <= now() RETURNING id"
+        )
+
+        for record in records:
+            self.bot.blacklist.remove(record["id"])
+
+    @prune_blacklist.before_loop
+    async def before_prune_blacklist(self):
+        await self.bot.db_ready.wait()
+
 
 def setup(bot):
     bot.add_cog(Checks(bot))
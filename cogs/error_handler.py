@@ -3,7 +3,7 @@ import traceback
 from functools import cached_property
 
 from discord.ext import commands
-from utils.CustomErrors import Blacklisted
+from utils.CustomErrors import Blacklisted, DatabaseUnavailable
 from utils.subclasses import CustomEmbed
 
 CODEBLOCK = "```fix\n{}```"
@@ -19,6 +19,7 @@ class ErrorHandler(commands.Cog):
             commands.MissingRequiredArgument,
             commands.CommandOnCooldown,
             Blacklisted,
+            DatabaseUnavailable,
             commands.MissingPermissions,
             commands.BotMissingPermissions,
             commands.TooManyArguments,
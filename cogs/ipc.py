@@ -14,6 +14,10 @@ class IpcRoutes(commands.Cog):
     async def member_count_for(self, data):
         return self.bot.get_guild(int(data)).member_count
 
+    @ipc.server.route()
+    async def log_queue_stats(self, data):
+        return self.bot.log_scheduler.stats()
+
 
 def setup(bot):
     bot.add_cog(IpcRoutes(bot))
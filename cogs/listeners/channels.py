@@ -1,15 +1,29 @@
-from contextlib import suppress
 from datetime import datetime
 
 import discord
 from discord import AuditLogAction
 from discord.ext import commands
 from discord.ext.commands import Cog
+from utils.coalesce import Changes, Coalescer, diff_attributes
 from utils.enums import LoggingEnum
+from utils.scheduler import scheduled
 from utils.subclasses import CustomEmbed
-from utils.utils import get_audit, title_format
+from utils.utils import title_format
 
 TIME_TEMPLATE = "%b %d, %Y %I:%M %p"
+REORDER_LINES = 20
+CHANNEL_ATTRIBUTES = (
+    "name",
+    "position",
+    "category_id",
+    "topic",
+    "nsfw",
+    "slowmode_delay",
+    "bitrate",
+    "user_limit",
+    "rtc_region",
+    "overwrites",
+)
 
 
 def format_overwrites(overwrites):
@@ -29,201 +43,259 @@ def format_overwrites(overwrites):
 class ChannelsListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.get_enum = bot.utils.get_enum
+        self.updates = Coalescer(self.log_channel_updates)
+
+    def cog_unload(self):
+        self.updates.close()
 
     @Cog.listener("on_guild_channel_delete")
+    @scheduled(
+        LoggingEnum.CHANNELS,
+        "channels deleted",
+        action=AuditLogAction.channel_delete,
+    )
     async def on_channel_delete(self, channel):
         guild = channel.guild
 
-        if not channel.guild.me.guild_permissions.view_audit_log:
+        log_channel = await self.bot.router.route(guild, LoggingEnum.CHANNELS)
+
+        if log_channel is None:
             return
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.channel_delete, target_id=channel.id
+        )
 
-            log_channel = guild.get_channel(id)
+        embed = CustomEmbed(title="Channel Deleted", timestamp=datetime.utcnow())
 
-            entry = None
+        embed.add_field(
+            name="**Channel**",
+            value=(
+                f"Name: `{channel}` [{channel.id}]\n"
+                f"Type: `{channel.type}`\n"
+                f"Position: `{channel.position}`\n"
+                f"Created At: `{channel.created_at.strftime(TIME_TEMPLATE)}` (UTC)"
+            ),
+        )
 
-            if LoggingEnum.CHANNELS not in options or log_channel is None:
-                return
+        pending = []
 
-            if guild.me.guild_permissions.view_audit_log:
-                entry = (
-                    await guild.audit_logs(
-                        limit=1, action=AuditLogAction.channel_delete
-                    ).flatten()
-                )[0]
+        if entry is not None:
 
-            embed = CustomEmbed(title="Channel Deleted", timestamp=datetime.utcnow())
+            for diff in entry.after:
+                if diff[0] == "overwrites":
+                    if diff[1] is None:
+                        continue
+                    pending.append(
+                        self.bot.pastes.add_field(
+                            embed, name="Overwrites", text=format_overwrites(diff[1])
+                        )
+                    )
+                else:
+                    embed.add_field(
+                        name=title_format(diff[0]),
+                        value=f"`{diff[1]}`",
+                        inline=False,
+                    )
 
             embed.add_field(
-                name="**Channel**",
-                value=(
-                    f"Name: `{channel}` [{channel.id}]\n"
-                    f"Type: `{channel.type}`\n"
-                    f"Position: `{channel.position}`\n"
-                    f"Created At: `{channel.created_at.strftime(TIME_TEMPLATE)}` (UTC)"
-                ),
+                name="**Moderator**", value=(f"{entry.user}"), inline=False
             )
-
-            if entry is not None:
-
-                for diff in entry.after:
-                    if diff[0] == "overwrites":
-                        if diff[1] is None:
-                            continue
-                        url = await self.bot.utils.paste(
-                            format_overwrites(diff[1]), syntax=None
-                        )
-                        embed.add_field(name="Overwrites", value=url or "None")
-                    else:
-                        embed.add_field(
-                            name=title_format(diff[0]),
-                            value=f"`{diff[1]}`",
-                            inline=False,
-                        )
-
-                embed.add_field(
-                    name="**Moderator**", value=(f"{entry.user}"), inline=False
-                )
-            else:
+        else:
+            embed.add_field(
                 embed.add_field(
-                    embed.add_field(
-                        name="**Moderator**",
-                        value="Cannot access the audit log to get more info.",
-                    )
+                    name="**Moderator**",
+                    value="Cannot access the audit log to get more info.",
                 )
+            )
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            pending=pending,
+            category=LoggingEnum.CHANNELS,
+            actor=getattr(entry, "user", None),
+            target=channel,
+        )
 
     @Cog.listener("on_guild_channel_create")
+    @scheduled(
+        LoggingEnum.CHANNELS,
+        "channels created",
+        action=AuditLogAction.channel_create,
+    )
     async def on_channel_create(self, channel):
         guild = channel.guild
 
-        if not channel.guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        log_channel = await self.bot.router.route(guild, LoggingEnum.CHANNELS)
 
-            log_channel = guild.get_channel(id)
-
-            if LoggingEnum.CHANNELS not in options or log_channel is None:
-                return
-
-            entry = await get_audit(channel.guild, AuditLogAction.channel_create)
-
-            if entry is None:
-                return
-
-            embed = CustomEmbed(title="Channel Created", timestamp=datetime.utcnow())
+        if log_channel is None:
+            return
 
-            embed.add_field(
-                name="**Basic Info**",
-                value=(
-                    f"Name: `{channel}` [{channel.id}]\n"
-                    f"Type: `{channel.type}`\n"
-                    f"Position: `{channel.position}`\n"
-                    f"Created At: `{channel.created_at.strftime(TIME_TEMPLATE)}` (UTC)\n"
-                    f"Category: `{channel.category}`"
-                    f"Moderator: {entry.user} [{entry.user.id}]\n"
-                ),
-            )
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.channel_create, target_id=channel.id
+        )
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    [
-                        title_format(
-                            diff[0] + f"`{diff[1]}`"
-                            for diff in entry.after
-                            if diff[0] != "overwrites"
-                        )
-                    ]
-                ),
-            )
+        if entry is None:
+            return
 
-            for diff in entry.after:
-                if diff[0] == "overwrites":
-                    embed.add_field(
-                        name="Overwrites",
-                        value=await self.bot.utils.paste(format_overwrites(diff[1])),
+        embed = CustomEmbed(title="Channel Created", timestamp=datetime.utcnow())
+
+        embed.add_field(
+            name="**Basic Info**",
+            value=(
+                f"Name: `{channel}` [{channel.id}]\n"
+                f"Type: `{channel.type}`\n"
+                f"Position: `{channel.position}`\n"
+                f"Created At: `{channel.created_at.strftime(TIME_TEMPLATE)}` (UTC)\n"
+                f"Category: `{channel.category}`"
+                f"Moderator: {entry.user} [{entry.user.id}]\n"
+            ),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                [
+                    title_format(
+                        diff[0] + f"`{diff[1]}`"
+                        for diff in entry.after
+                        if diff[0] != "overwrites"
                     )
+                ]
+            ),
+        )
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        pending = [
+            self.bot.pastes.add_field(
+                embed, name="Overwrites", text=format_overwrites(diff[1])
+            )
+            for diff in entry.after
+            if diff[0] == "overwrites"
+        ]
+
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            pending=pending,
+            category=LoggingEnum.CHANNELS,
+            actor=entry.user,
+            target=channel,
+        )
 
     @Cog.listener("on_guild_channel_update")
     async def on_channel_update(self, before, after):
-
-        guild = after.guild
-
-        if not after.guild.me.guild_permissions.view_audit_log:
+        self.updates.put(after.guild, after.id, before, after)
+
+    @scheduled(
+        LoggingEnum.CHANNELS,
+        "channel edit bursts",
+        action=AuditLogAction.channel_update,
+        guild=lambda bot, guild, changes: guild,
+    )
+    async def log_channel_updates(self, guild: discord.Guild, changes: Changes):
+        log_channel = await self.bot.router.route(guild, LoggingEnum.CHANNELS)
+
+        if log_channel is None:
             return
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
-
-            log_channel = guild.get_channel(id)
-
-            if LoggingEnum.CHANNELS not in options or log_channel is None:
-                return
-
-            if guild.me.guild_permissions.view_audit_log:
-                entry = (
-                    await guild.audit_logs(
-                        limit=1, action=AuditLogAction.channel_update
-                    ).flatten()
-                )[0]
-
-            embed = CustomEmbed(title="Channel Edited", timestamp=datetime.utcnow())
-
-            embed.add_field(
-                name="Basic Info",
-                value=(
-                    f"Channel: {after.mention} [{after.id}] \n"
-                    f"Moderator: {entry.user} [{entry.user.id}]\n"
-                ),
+        moved = []
+
+        for before, after in changes.values():
+            changed = diff_attributes(before, after, CHANNEL_ATTRIBUTES)
+
+            if changed == ["position"]:
+                moved.append((before, after))
+            elif changed:
+                await self.log_channel_update(log_channel, before, after, changed)
+
+        if moved:
+            await self.log_reorder(log_channel, guild, moved)
+
+    async def log_channel_update(self, log_channel, before, after, changed):
+        entry = await self.bot.audit.fetch(
+            after.guild, AuditLogAction.channel_update, target_id=after.id
+        )
+
+        embed = CustomEmbed(title="Channel Edited", timestamp=datetime.utcnow())
+
+        embed.add_field(
+            name="Basic Info",
+            value=(
+                f"Channel: {after.mention} [{after.id}] \n"
+                f"Moderator: {getattr(entry, 'user', 'Unknown')}\n"
+            ),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(attribute)}: "
+                f"`{getattr(before, attribute)}` -> `{getattr(after, attribute)}`"
+                for attribute in changed
+                if attribute != "overwrites"
             )
+            or "None",
+        )
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    [
-                        title_format(
-                            diff[0] + f"`{diff[1]}`"
-                            for diff in entry.after
-                            if diff[0] != "overwrites"
-                        )
-                    ]
-                ),
-            )
+        pending = []
 
-            for diff in entry.after:
-                if diff[0] == "overwrites":
-                    embed.add_field(
-                        name="Overwrites",
-                        value=await self.bot.utils.paste(format_overwrites(diff[1])),
-                    )
+        if "overwrites" in changed:
+            pending.append(
+                self.bot.pastes.add_field(
+                    embed,
+                    name="Overwrites",
+                    text=format_overwrites(after.overwrites.items()),
+                )
+            )
 
+        if entry is not None:
             embed.set_author(name=entry.user.name, url=entry.user.avatar_url)
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            pending=pending,
+            category=LoggingEnum.CHANNELS,
+            actor=getattr(entry, "user", None),
+            target=after,
+        )
+
+    async def log_reorder(self, log_channel, guild, moved):
+        # One entry is enough to say who did it, the rest are the same drag.
+        entry = await self.bot.audit.fetch(guild, AuditLogAction.channel_update)
+
+        moved.sort(key=lambda change: change[1].position)
+
+        embed = CustomEmbed(
+            title=f"{len(moved)} Channels Reordered",
+            description="\n".join(
+                f"{after.mention}: `{before.position}` -> `{after.position}`"
+                for before, after in moved[:REORDER_LINES]
+            )
+            + (
+                f"\n... and {len(moved) - REORDER_LINES} more"
+                if len(moved) > REORDER_LINES
+                else ""
+            ),
+            timestamp=datetime.utcnow(),
+        )
+
+        if entry is not None:
+            embed.add_field(name="Moderator", value=f"{entry.user} [{entry.user.id}]")
+
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.CHANNELS,
+            actor=getattr(entry, "user", None),
+        )
 
     # @Cog.listener('on_guild_channel_pins_update')
     # async def pins_update(self, channel, last_pin):
     #     guild = channel.guild
 
-    #     if LoggingEnum.NONE not in (options := self.get_enum(guild.id)) and (id := self.bot.cache[guild.id].get("logid")) is not None:
+    #     if LoggingEnum.NONE not in (options := self.bot.cache[guild.id].options) and (id := self.bot.cache[guild.id].logid) is not None:
 
     #         log_channel = guild.get_channel(id)
 
@@ -1,293 +1,418 @@
-from contextlib import suppress
 
 import discord
 from discord import AuditLogAction
 from discord.ext import commands
 from discord.ext.commands import Cog
+from utils.coalesce import Changes, Coalescer, diff_attributes
 from utils.enums import LoggingEnum
+from utils.scheduler import scheduled
 from utils.subclasses import CustomEmbed
-from utils.utils import get_audit, title_format
+from utils.utils import title_format
+
+REORDER_LINES = 20
+ROLE_ATTRIBUTES = ("name", "position", "permissions", "colour", "hoist", "mentionable")
+
+
+def format_permissions(role: discord.Role, permissions: discord.Permissions) -> str:
+    return f"{role.name}\n" + "\n".join(
+        f"{perm} : {value}" for perm, value in dict(permissions).items()
+    )
 
 
 class GuildEventListeners(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.get_enum = bot.utils.get_enum
+        self.role_updates = Coalescer(self.log_role_updates)
+
+    def cog_unload(self):
+        self.role_updates.close()
 
     @Cog.listener("on_guild_update")
+    @scheduled(
+        LoggingEnum.GUILD,
+        "guild updates",
+        action=AuditLogAction.guild_update,
+        guild=lambda bot, before, after: after,
+    )
     async def guild_update(self, before: discord.Guild, after: discord.Guild):
 
-        if not after.me.guild_permissions.view_audit_log:
+        log_channel = await self.bot.router.route(after, LoggingEnum.GUILD)
+
+        if log_channel is None:
             return
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(after.id))
-            and (id := self.bot.cache[after.id].get("logid")) is not None
-        ):
+        entry = await self.bot.audit.fetch(
+            after, AuditLogAction.guild_update, target_id=after.id
+        )
 
-            log_channel = after.get_channel(id)
+        if entry is None:
+            return
 
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
+        embed = CustomEmbed(title="Guild Updated")
 
-            entry = await get_audit(after, AuditLogAction.guild_update)
+        embed.add_field(
+            name="Basic Info", value=(f"Moderator: {entry.user} [{entry.user.id}]")
+        )
 
-            if entry is None:
-                return
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                [f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after]
+            ),
+        )
 
-            embed = CustomEmbed(title="Guild Updated")
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            embed.add_field(
-                name="Basic Info", value=(f"Moderator: {entry.user} [{entry.user.id}]")
-            )
-
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    [f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after]
-                ),
-            )
-
-            embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
-
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+            target=after,
+        )
 
     @Cog.listener()
+    @scheduled(
+        LoggingEnum.GUILD,
+        "emoji updates",
+        action=AuditLogAction.emoji_update,
+        guild=lambda bot, guild, *_: guild,
+    )
     async def on_guild_emojis_update(self, guild, before, after):
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
 
-            log_channel = guild.get_channel(id)
-
-            entry = None
+        if log_channel is None:
+            return
 
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
+        entry = await self.bot.audit.fetch(guild, AuditLogAction.emoji_update)
 
-            entry = await get_audit(guild, AuditLogAction.emoji_update)
+        if entry is None:
+            return
 
-            embed = CustomEmbed(title="Emojis Updated").add_field(
-                name="Basic Info",
-                value=(f"Moderator: {entry.user} [{entry.user.id}]\n"),
-            )
+        embed = CustomEmbed(title="Emojis Updated").add_field(
+            name="Basic Info",
+            value=(f"Moderator: {entry.user} [{entry.user.id}]\n"),
+        )
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after
-                ),
-                inline=False,
-            )
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after
+            ),
+            inline=False,
+        )
 
-            embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+        )
 
     @Cog.listener()
+    @scheduled(LoggingEnum.GUILD, "roles created", action=AuditLogAction.role_create)
     async def on_guild_role_create(self, role: discord.Role):
         guild = role.guild
 
-        if not guild.me.guild_permissions.view_audit_log:
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
+
+        if log_channel is None:
             return
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.role_create, target_id=role.id
+        )
+
+        if entry is None:
+            return
 
-            log_channel = guild.get_channel(id)
+        embed = CustomEmbed(title="Role Created").add_field(
+            name="Basic Info",
+            value=(
+                f"Moderator: {entry.user} [{entry.user.id}]\n"
+                f"Role: {role.name} [{role.id}]"
+            ),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(diff[0])}: `{diff[1]}`"
+                for diff in entry.after
+                if diff[0] not in ("permissions", "permissions_new")
+            ),
+            inline=False,
+        )
+
+        pending = [
+            self.bot.pastes.add_field(
+                embed,
+                name=title_format(diff[0]),
+                text=format_permissions(role, diff[1]),
+            )
+            for diff in entry.after
+            if diff[0] == "permissions"
+        ]
 
-            entry = None
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            pending=pending,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+            target=role,
+        )
 
-            entry = await get_audit(guild, AuditLogAction.role_create)
+    @Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.role_updates.put(after.guild, after.id, before, after)
+
+    @scheduled(
+        LoggingEnum.GUILD,
+        "role edit bursts",
+        action=AuditLogAction.role_update,
+        guild=lambda bot, guild, changes: guild,
+    )
+    async def log_role_updates(self, guild: discord.Guild, changes: Changes):
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
+
+        if log_channel is None:
+            return
 
-            embed = CustomEmbed(title="Role Created").add_field(
-                name="Basic Info",
-                value=(
-                    f"Moderator: {entry.user} [{entry.user.id}]\n"
-                    f"Role: {role.name} [{role.id}]"
-                ),
+        moved = []
+
+        for before, after in changes.values():
+            changed = diff_attributes(before, after, ROLE_ATTRIBUTES)
+
+            if changed == ["position"]:
+                moved.append((before, after))
+            elif changed:
+                await self.log_role_update(log_channel, before, after, changed)
+
+        if moved:
+            await self.log_reorder(log_channel, guild, moved)
+
+    async def log_role_update(self, log_channel, before, after, changed):
+        entry = await self.bot.audit.fetch(
+            after.guild, AuditLogAction.role_update, target_id=after.id
+        )
+
+        embed = CustomEmbed(title="Role Edited").add_field(
+            name="Basic Info",
+            value=(
+                f"Moderator: {getattr(entry, 'user', 'Unknown')}\n"
+                f"Role: {after.mention} [{after.id}]"
+            ),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(attribute)}: "
+                f"`{getattr(before, attribute)}` -> `{getattr(after, attribute)}`"
+                for attribute in changed
+                if attribute != "permissions"
             )
+            or "None",
+            inline=False,
+        )
 
+        if "permissions" in changed:
             embed.add_field(
-                name="Advanced Info",
+                name="Permissions",
                 value="\n".join(
-                    f"{title_format(diff[0])}: `{diff[1]}`"
-                    for diff in entry.after
-                    if diff[0] not in ("permissions", "permissions_new")
-                ),
+                    f"{title_format(perm)}: `{getattr(before.permissions, perm)}`"
+                    f" -> `{value}`"
+                    for perm, value in after.permissions
+                    if getattr(before.permissions, perm) != value
+                )[:1024],
                 inline=False,
             )
 
-            for diff in entry.after:
-                if diff[0] in ("permissions"):
-                    embed.add_field(
-                        name=title_format(diff[0]),
-                        value=await self.bot.utils.paste(
-                            (
-                                f"{role.name}\n"
-                                + "\n".join(
-                                    f"{perm} : {value}"
-                                    for perm, value in dict(diff[1]).items()
-                                )
-                            )
-                        ),
-                    )
-
+        if entry is not None:
             embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=getattr(entry, "user", None),
+            target=after,
+        )
+
+    async def log_reorder(self, log_channel, guild, moved):
+        # One entry is enough to say who did it, the rest are the same drag.
+        entry = await self.bot.audit.fetch(guild, AuditLogAction.role_update)
+
+        moved.sort(key=lambda change: change[1].position, reverse=True)
+
+        embed = CustomEmbed(
+            title=f"{len(moved)} Roles Reordered",
+            description="\n".join(
+                f"{after.mention}: `{before.position}` -> `{after.position}`"
+                for before, after in moved[:REORDER_LINES]
+            )
+            + (
+                f"\n... and {len(moved) - REORDER_LINES} more"
+                if len(moved) > REORDER_LINES
+                else ""
+            ),
+        )
+
+        if entry is not None:
+            embed.add_field(name="Moderator", value=f"{entry.user} [{entry.user.id}]")
+
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=getattr(entry, "user", None),
+        )
 
     @Cog.listener()
+    @scheduled(LoggingEnum.GUILD, "roles deleted", action=AuditLogAction.role_delete)
     async def on_guild_role_delete(self, role: discord.Role):
         guild = role.guild
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
-
-            log_channel = guild.get_channel(id)
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
 
-            entry = None
-
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
+        if log_channel is None:
+            return
 
-            entry = await get_audit(guild, AuditLogAction.role_delete)
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.role_delete, target_id=role.id
+        )
 
-            embed = CustomEmbed(title="Role Deleted").add_field(
-                name="Basic Info",
-                value=(
-                    f"Moderator: {entry.user} [{entry.user.id}]\n"
-                    f"Role: {role.mention}"
-                ),
-            )
+        if entry is None:
+            return
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    f"{title_format(diff[0])}: `{diff[1]}`"
-                    for diff in entry.before
-                    if diff[0] not in ("permissions", "permissions_new")
-                ),
-                inline=False,
+        embed = CustomEmbed(title="Role Deleted").add_field(
+            name="Basic Info",
+            value=(
+                f"Moderator: {entry.user} [{entry.user.id}]\n"
+                f"Role: {role.mention}"
+            ),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(diff[0])}: `{diff[1]}`"
+                for diff in entry.before
+                if diff[0] not in ("permissions", "permissions_new")
+            ),
+            inline=False,
+        )
+
+        pending = [
+            self.bot.pastes.add_field(
+                embed,
+                name=title_format(diff[0]),
+                text=format_permissions(role, diff[1]),
             )
+            for diff in entry.before
+            if diff[0] == "permissions"
+        ]
 
-            for diff in entry.before:
-                if diff[0] in ("permissions"):
-                    embed.add_field(
-                        name=title_format(diff[0]),
-                        value=await self.bot.utils.paste(
-                            (
-                                f"{role.name}\n"
-                                + "\n".join(
-                                    f"{perm} : {value}"
-                                    for perm, value in dict(diff[1]).items()
-                                )
-                            )
-                        ),
-                    )
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
-
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            pending=pending,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+            target=role,
+        )
 
     @Cog.listener()
+    @scheduled(
+        LoggingEnum.GUILD, "invites created", action=AuditLogAction.invite_create
+    )
     async def on_invite_create(self, invite: discord.Invite):
         guild = invite.guild
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        if log_channel is None:
+            return
 
-            log_channel = guild.get_channel(id)
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.invite_create, target_id=invite.code
+        )
 
-            entry = None
+        if entry is None:
+            return
 
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
+        embed = CustomEmbed(title="Invite Created")
 
-            entry = await get_audit(guild, AuditLogAction.invite_create)
+        embed.add_field(
+            name="Basic Info", value=(f"User: {entry.user} [{entry.user.id}]\n")
+        )
 
-            embed = CustomEmbed(title="Invite Created")
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after
+            ),
+            inline=False,
+        )
 
-            embed.add_field(
-                name="Basic Info", value=(f"User: {entry.user} [{entry.user.id}]\n")
-            )
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.after
-                ),
-                inline=False,
-            )
-
-            embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
-
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+        )
 
     @Cog.listener()
+    @scheduled(
+        LoggingEnum.GUILD, "invites deleted", action=AuditLogAction.invite_delete
+    )
     async def on_invite_delete(self, invite: discord.Invite):
         guild = invite.guild
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
-
-            log_channel = guild.get_channel(id)
-
-            entry = None
-
-            if LoggingEnum.GUILD not in options or log_channel is None:
-                return
-
-            entry = await get_audit(guild, AuditLogAction.invite_delete)
-
-            embed = CustomEmbed(title="Invite Deleted")
+        log_channel = await self.bot.router.route(guild, LoggingEnum.GUILD)
 
-            embed.add_field(
-                name="Basic Info",
-                value=(f"Moderator: {entry.user} [{entry.user.id}]\n"),
-            )
+        if log_channel is None:
+            return
 
-            embed.add_field(
-                name="Advanced Info",
-                value="\n".join(
-                    f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.before
-                ),
-                inline=False,
-            )
+        entry = await self.bot.audit.fetch(
+            guild, AuditLogAction.invite_delete, target_id=invite.code
+        )
 
-            embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
+        if entry is None:
+            return
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        embed = CustomEmbed(title="Invite Deleted")
+
+        embed.add_field(
+            name="Basic Info",
+            value=(f"Moderator: {entry.user} [{entry.user.id}]\n"),
+        )
+
+        embed.add_field(
+            name="Advanced Info",
+            value="\n".join(
+                f"{title_format(diff[0])}: `{diff[1]}`" for diff in entry.before
+            ),
+            inline=False,
+        )
+
+        embed.set_author(name=entry.user.name, icon_url=entry.user.avatar_url)
+
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.GUILD,
+            actor=entry.user,
+        )
 
 
 def setup(bot):
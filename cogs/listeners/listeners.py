@@ -10,11 +10,24 @@ class Listeners(commands.Cog):
     def __init__(self, bot):
         self.bot: HarleyBot = bot
 
-    @commands.Cog.listener("on_message_edit")
-    async def reinvoke_on_edit(self, before, after):
-        if before.content != after.content:
-            ctx = await self.bot.get_context(after)
-            await self.bot.invoke(ctx)
+    @commands.Cog.listener("on_message_content_edit")
+    async def reinvoke_on_edit(
+        self, payload: discord.RawMessageUpdateEvent, before, after
+    ):
+        # Only messages the cache still holds are recent enough to reinvoke,
+        # an edit to an old command shouldn't run it again.
+        if before is None or "author" not in payload.data:
+            return
+
+        # discord.py's own message cache is kept tiny, build the message instead.
+
+        if (channel := self.bot.get_channel(payload.channel_id)) is None:
+            return
+
+        message = discord.Message(
+            state=self.bot._connection, channel=channel, data=payload.data
+        )
+        await self.bot.process_commands(message)
 
     @commands.Cog.listener("on_command")
     async def counter(self, ctx):
@@ -23,11 +36,7 @@ class Listeners(commands.Cog):
     @commands.Cog.listener("on_guild_join")
     async def guild_join(self, guild: discord.Guild):
 
-        await self.bot.db.execute(
-            "INSERT INTO config(id) VALUES($1) ON CONFLICT DO NOTHING", guild.id
-        )
-
-        await self.bot.refresh_cache_for(guild.id)
+        await self.bot.cache.create(guild.id)
 
         hook = self.bot.hook
 
@@ -49,7 +58,7 @@ class Listeners(commands.Cog):
     @commands.Cog.listener("on_guild_remove")
     async def guild_leave(self, guild: discord.Guild):
 
-        await self.bot.db.execute("DELETE FROM config WHERE id = $1")
+        await self.bot.cache.delete(guild.id)
 
         hook = self.bot.logger
 
@@ -85,25 +94,28 @@ class Listeners(commands.Cog):
             MENTION_TEMPLATE.format(self.bot.user.id),
         ):
 
-            prefixes = await self.bot.get_prefix(message)
+            config = (
+                await self.bot.cache.fetch(message.guild.id)
+                if message.guild is not None
+                else None
+            )
+            prefix = config.prefix if config is not None else "h,"
 
             await message.reply(
                 embed=CustomEmbed(
-                    description=f"My prefixes are `@Harley ` and `{discord.utils.escape_mentions(prefixes[2])}`."
+                    description=f"My prefixes are `@Harley ` and `{discord.utils.escape_mentions(prefix)}`."
                 )
             )
 
-    @commands.Cog.listener("on_message_delete")
-    async def delete_message_on_invoking_delete(self, message: discord.Message):
-        if message.author.bot or message.author == self.bot.user:
-            return
-
-        ctx: HarleyContext = await self.bot.get_context(message)
-
-        if ctx.mapped_message is not None:
-            await ctx.mapped_message.delete()
+    @commands.Cog.listener("on_raw_message_delete")
+    async def delete_message_on_invoking_delete(
+        self, payload: discord.RawMessageDeleteEvent
+    ):
+        # Only invocations by users are mapped, so bots are never found here.
+        mapped_message = self.bot.edit_mapping.pop(payload.message_id, None)
 
-            self.bot.edit_mapping.pop(ctx.message.id, None)
+        if mapped_message is not None:
+            await mapped_message.delete()
 
 
 def setup(bot):
@@ -1,152 +1,244 @@
-from contextlib import suppress
 from datetime import datetime
+from typing import List, Optional
 
 import discord
 from discord import AuditLogAction
 from discord.ext import commands
 from discord.ext.commands import Cog
 from utils.enums import LoggingEnum
+from utils.message_cache import CachedMessage
+from utils.scheduler import scheduled
 from utils.subclasses import CustomEmbed
-from utils.utils import get_audit
+from utils.transcript import build_transcript
 
 
-class MessagesListener(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.get_enum = bot.utils.get_enum
-
-    @Cog.listener("on_message_delete")
-    async def on_msg_delete(self, message: discord.Message):
+def format_content(message: Optional[CachedMessage], *, empty: str) -> str:
+    if message is None:
+        return "Message was not cached."
 
-        if message.author.bot:
-            return
+    if message.content:
+        return discord.utils.escape_markdown(message.content)[:1024]
 
-        guild = message.guild
+    if message.attachments:
+        return f"Message had {message.attachments} attachment(s)."
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
+    return empty
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
 
-            log_channel = guild.get_channel(id)
+def payload_guild(bot, payload, *_) -> Optional[discord.Guild]:
+    return bot.get_guild(payload.guild_id) if payload.guild_id else None
 
-            entry = None
 
-            if LoggingEnum.MESSAGE not in options or log_channel is None:
-                return
+def format_author(guild: discord.Guild, message: Optional[CachedMessage]) -> str:
+    if message is None:
+        return "Unknown"
 
-            entry = await get_audit(message.guild, AuditLogAction.message_delete)
+    return f"{guild.get_member(message.author_id) or 'Unknown'} [{message.author_id}]"
 
-            embed = CustomEmbed(
-                title="Message Deleted",
-                description=(
-                    f"Author: {message.author} [{message.author.id}] \n"
-                    f"Channel: {message.channel} [{message.channel.id}] \n"
-                ),
-                timestamp=datetime.utcnow(),
-            )
 
-            embed.add_field(
-                name="**Content**",
-                value=discord.utils.escape_markdown(message.content) or "None"
-                if not message.embeds
-                else "Message had embeds.",
-                inline=False,
-            )
-
-            if entry:
-                embed.add_field(
-                    name="**Moderator**",
-                    value=(f"Moderator: {entry.user} [{entry.user.id}]"),
-                    inline=False,
-                )
+class MessagesListener(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+    @Cog.listener("on_raw_message_delete")
+    async def on_msg_delete(self, payload: discord.RawMessageDeleteEvent):
+        # Pop before awaiting anything so the cache never holds deleted messages.
+        message = self.bot.messages.pop(payload.channel_id, payload.message_id)
 
-    @Cog.listener("on_message_edit")
-    async def on_msg_edit(self, before: discord.Message, after: discord.Message):
-        if before.author.bot:
+        if payload.guild_id is None:
             return
 
-        guild = before.guild
+        if message is None and (cached := payload.cached_message) is not None:
+            message = CachedMessage.from_message(cached)
 
-        if not guild.me.guild_permissions.view_audit_log:
+        if message is not None and message.bot:
             return
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        await self.log_delete(payload, message)
 
-            log_channel = guild.get_channel(id)
+    @scheduled(
+        LoggingEnum.MESSAGE,
+        "messages deleted",
+        action=AuditLogAction.message_delete,
+        guild=payload_guild,
+    )
+    async def log_delete(
+        self, payload: discord.RawMessageDeleteEvent, message: Optional[CachedMessage]
+    ):
+        guild = self.bot.get_guild(payload.guild_id)
 
-            if LoggingEnum.MESSAGE not in options or log_channel is None:
-                return
+        log_channel = await self.bot.router.route(guild, LoggingEnum.MESSAGE)
 
-            embed = CustomEmbed(title="Message Edited", timestamp=datetime.utcnow())
+        if log_channel is None:
+            return
 
-            embed.add_field(
-                name="Before Content",
-                value=discord.utils.escape_markdown(before.content)
-                or "Message only contained embeds.",
-                inline=False,
+        entry = (
+            await self.bot.audit.fetch(
+                guild, AuditLogAction.message_delete, target_id=message.author_id
             )
-
+            if message is not None
+            else None
+        )
+
+        channel = guild.get_channel(payload.channel_id)
+
+        embed = CustomEmbed(
+            title="Message Deleted",
+            description=(
+                f"Author: {format_author(guild, message)} \n"
+                f"Channel: {channel} [{payload.channel_id}] \n"
+            ),
+            timestamp=datetime.utcnow(),
+        )
+
+        embed.add_field(
+            name="**Content**",
+            value=format_content(message, empty="None"),
+            inline=False,
+        )
+
+        if entry:
             embed.add_field(
-                name="After Content",
-                value=discord.utils.escape_markdown(after.content)
-                or "Message only contained embeds.",
+                name="**Moderator**",
+                value=(f"Moderator: {entry.user} [{entry.user.id}]"),
                 inline=False,
             )
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.MESSAGE,
+            # Without an audit log entry the author deleted it themselves.
+            actor=entry.user if entry else getattr(message, "author_id", None),
+            target=getattr(message, "author_id", None),
+        )
+
+    @Cog.listener("on_message_content_edit")
+    async def on_msg_edit(
+        self,
+        payload: discord.RawMessageUpdateEvent,
+        before: Optional[CachedMessage],
+        after: CachedMessage,
+    ):
+        if payload.guild_id is None or after.bot:
+            return
 
-    @Cog.listener("on_bulk_message_delete")
-    async def bulk_delete(self, messages: list[discord.Message]):
-        guild = messages[0].guild
+        await self.log_edit(payload, before, after)
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
+    @scheduled(LoggingEnum.MESSAGE, "messages edited", guild=payload_guild)
+    async def log_edit(
+        self,
+        payload: discord.RawMessageUpdateEvent,
+        before: Optional[CachedMessage],
+        after: CachedMessage,
+    ):
+        guild = self.bot.get_guild(payload.guild_id)
 
-        if (
-            LoggingEnum.NONE not in (options := self.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
+        log_channel = await self.bot.router.route(guild, LoggingEnum.MESSAGE)
 
-            log_channel = guild.get_channel(id)
+        if log_channel is None:
+            return
 
-            entry = None
+        embed = CustomEmbed(
+            title="Message Edited",
+            description=(
+                f"Author: {format_author(guild, after)} \n"
+                f"Channel: {guild.get_channel(payload.channel_id)} "
+                f"[{payload.channel_id}] \n"
+            ),
+            timestamp=datetime.utcnow(),
+        )
+
+        embed.add_field(
+            name="Before Content",
+            value=format_content(before, empty="Message only contained embeds."),
+            inline=False,
+        )
+
+        embed.add_field(
+            name="After Content",
+            value=format_content(after, empty="Message only contained embeds."),
+            inline=False,
+        )
+
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            category=LoggingEnum.MESSAGE,
+            actor=after.author_id,
+        )
+
+    @Cog.listener("on_raw_bulk_message_delete")
+    async def bulk_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        messages = [
+            message
+            for message in self.bot.messages.pop_many(
+                payload.channel_id, payload.message_ids
+            )
+            if not message.bot
+        ]
+
+        await self.log_bulk_delete(payload, messages)
+
+    @scheduled(
+        LoggingEnum.MESSAGE,
+        "bulk deletes",
+        action=AuditLogAction.message_bulk_delete,
+        guild=payload_guild,
+    )
+    async def log_bulk_delete(
+        self,
+        payload: discord.RawBulkMessageDeleteEvent,
+        messages: List[CachedMessage],
+    ):
+        guild = self.bot.get_guild(payload.guild_id)
+
+        log_channel = await self.bot.router.route(guild, LoggingEnum.MESSAGE)
+
+        if log_channel is None:
+            return
 
-            if LoggingEnum.MESSAGE not in options or log_channel is None:
-                return
+        entry = await self.bot.audit.fetch(
+            guild,
+            AuditLogAction.message_bulk_delete,
+            target_id=payload.channel_id,
+        )
 
-            if guild.me.guild_permissions.view_audit_log:
-                entry = (
-                    await guild.audit_logs(
-                        limit=1, action=AuditLogAction.message_bulk_delete
-                    ).flatten()
-                )[0]
-                if (datetime.utcnow() - entry.created_at).total_seconds() > 5:
-                    entry = None
+        embed = CustomEmbed(
+            title=f"{len(payload.message_ids)} Bulk Deleted",
+            timestamp=datetime.utcnow(),
+        )
 
-            embed = CustomEmbed(
-                title=f"{len(messages)} Bulk Deleted", timestamp=datetime.utcnow()
+        if entry:
+            embed.add_field(
+                name="**Moderator**",
+                value=(f"Moderator: {entry.user} [{entry.user.id}]"),
+                inline=False,
             )
 
-            if entry:
-                embed.add_field(
-                    name="**Moderator**",
-                    value=(f"Moderator: {entry.user} [{entry.user.id}]"),
-                    inline=False,
-                )
+        file = None
+
+        if messages:
+            file = await build_transcript(
+                self.bot,
+                guild,
+                payload.channel_id,
+                messages,
+                total=len(payload.message_ids),
+            )
+            embed.add_field(
+                name="**Transcript**",
+                value=f"{len(messages)} cached message(s), see the attachment.",
+                inline=False,
+            )
 
-            with suppress(discord.Forbidden):
-                await log_channel.send(embed=embed)
+        await self.bot.router.send(
+            log_channel,
+            embed,
+            file=file,
+            category=LoggingEnum.MESSAGE,
+            actor=getattr(entry, "user", None),
+        )
 
 
 def setup(bot):
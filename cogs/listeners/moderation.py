@@ -1,12 +1,11 @@
-from contextlib import suppress
 from datetime import datetime
 
 import discord
 from discord import AuditLogAction
 from discord.ext import commands
 from utils.enums import LoggingEnum
+from utils.scheduler import scheduled
 from utils.subclasses import CustomEmbed
-from utils.utils import get_audit
 
 
 class ModerationListeners(commands.Cog):
@@ -14,118 +13,123 @@ class ModerationListeners(commands.Cog):
         self.bot = bot
 
     @commands.Cog.listener()
+    @scheduled(
+        LoggingEnum.MODERATION,
+        "members banned",
+        action=AuditLogAction.ban,
+        guild=lambda bot, guild, user: guild,
+    )
     async def on_member_ban(self, guild: discord.Guild, user: discord.User):
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.bot.utils.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
-
-            if LoggingEnum.MODERATION not in options:
-                return
-
-            channel = self.bot.get_channel(id)
-
-            if channel is None:
-                return
+        channel = await self.bot.router.route(guild, LoggingEnum.MODERATION)
 
-            entry = await get_audit(guild, AuditLogAction.ban)
+        if channel is None:
+            return
 
-            embed = CustomEmbed(
-                title="**Member Banned**",
-                description=(
-                    f"User: {user} [{user.id}]\n"
-                    f"Moderator: {entry.user}"
-                    f"Reason: {getattr(entry, 'reason', 'None')}\n"
-                ),
-                timestamp=datetime.utcnow(),
-            ).set_thumbnail(url=user.avatar_url)
+        entry = await self.bot.audit.fetch(guild, AuditLogAction.ban, target_id=user.id)
 
-            embed.set_author(name=entry.user.name, url=entry.user_avatar_url)
+        if entry is None:
+            return
 
-            with suppress(discord.Forbidden):
-                await channel.send(embed=embed)
+        embed = CustomEmbed(
+            title="**Member Banned**",
+            description=(
+                f"User: {user} [{user.id}]\n"
+                f"Moderator: {entry.user}"
+                f"Reason: {getattr(entry, 'reason', 'None')}\n"
+            ),
+            timestamp=datetime.utcnow(),
+        ).set_thumbnail(url=user.avatar_url)
+
+        embed.set_author(name=entry.user.name, url=entry.user_avatar_url)
+
+        await self.bot.router.send(
+            channel,
+            embed,
+            category=LoggingEnum.MODERATION,
+            actor=entry.user,
+            target=user,
+        )
 
     @commands.Cog.listener()
+    @scheduled(
+        LoggingEnum.MODERATION,
+        "members unbanned",
+        action=AuditLogAction.unban,
+        guild=lambda bot, guild, user: guild,
+    )
     async def on_member_unban(self, guild: discord.Guild, user: discord.User):
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE not in (options := self.bot.utils.get_enum(guild.id))
-            and (id := self.bot.cache[guild.id].get("logid")) is not None
-        ):
-
-            if LoggingEnum.MODERATION not in options:
-                return
+        channel = await self.bot.router.route(guild, LoggingEnum.MODERATION)
 
-            channel = self.bot.get_channel(id)
-
-            if channel is None:
-                return
+        if channel is None:
+            return
 
-            action = await get_audit(guild, AuditLogAction.unban)
+        action = await self.bot.audit.fetch(
+            guild, AuditLogAction.unban, target_id=user.id
+        )
 
-            embed = CustomEmbed(
-                title="**Member Unbanned**",
-                description=(
-                    f"User: {user} [{user.id}]\n"
-                    f"Reason: {getattr(action, 'reason', 'None')}\n"
-                ),
-                timestamp=datetime.utcnow(),
-            ).set_thumbnail(url=user.avatar_url)
+        embed = CustomEmbed(
+            title="**Member Unbanned**",
+            description=(
+                f"User: {user} [{user.id}]\n"
+                f"Reason: {getattr(action, 'reason', 'None')}\n"
+            ),
+            timestamp=datetime.utcnow(),
+        ).set_thumbnail(url=user.avatar_url)
 
-            if action:
-                embed.description += f"Moderator: {action.user}"
+        if action:
+            embed.description += f"Moderator: {action.user}"
 
-            embed.set_author(name=action.user.name, url=action.user.avatar_url)
+        embed.set_author(name=action.user.name, url=action.user.avatar_url)
 
-            with suppress(discord.Forbidden):
-                await channel.send(embed=embed)
+        await self.bot.router.send(
+            channel,
+            embed,
+            category=LoggingEnum.MODERATION,
+            actor=getattr(action, "user", None),
+            target=user,
+        )
 
     @commands.Cog.listener()
+    @scheduled(
+        LoggingEnum.MODERATION,
+        "members left or were kicked",
+        action=AuditLogAction.kick,
+    )
     async def on_member_remove(self, member):
 
-        if not member.guild.me.guild_permissions.view_audit_log:
-            return
-
-        if (
-            LoggingEnum.NONE
-            not in (options := self.bot.utils.get_enum(member.guild.id))
-            and (id := self.bot.cache[member.guild.id].get("logid")) is not None
-        ):
-
-            if LoggingEnum.MODERATION not in options:
-                return
+        channel = await self.bot.router.route(member.guild, LoggingEnum.MODERATION)
 
-            channel = self.bot.get_channel(id)
-
-            if channel is None:
-                return
-
-            entry = await get_audit(member.guild, AuditLogAction.kick)
-
-            if entry is None:
-                return
+        if channel is None:
+            return
 
-            embed = CustomEmbed(
-                title="**Member Kicked**",
-                description=(
-                    f"User: {member} [{member.id}]\n"
-                    f"Moderator: {entry.user} [{entry.user.id}]"
-                    f"Reason: {getattr(entry, 'reason', 'None')}\n"
-                ),
-                timestamp=datetime.utcnow(),
-            ).set_thumbnail(url=member.avatar_url)
+        entry = await self.bot.audit.fetch(
+            member.guild, AuditLogAction.kick, target_id=member.id
+        )
 
-            embed.set_author(name=entry.user.name, url=entry.user.avatar_url)
+        if entry is None:
+            return
 
-            with suppress(discord.Forbidden):
-                await channel.send(embed=embed)
+        embed = CustomEmbed(
+            title="**Member Kicked**",
+            description=(
+                f"User: {member} [{member.id}]\n"
+                f"Moderator: {entry.user} [{entry.user.id}]"
+                f"Reason: {getattr(entry, 'reason', 'None')}\n"
+            ),
+            timestamp=datetime.utcnow(),
+        ).set_thumbnail(url=member.avatar_url)
+
+        embed.set_author(name=entry.user.name, url=entry.user.avatar_url)
+
+        await self.bot.router.send(
+            channel,
+            embed,
+            category=LoggingEnum.MODERATION,
+            actor=entry.user,
+            target=member,
+        )
 
 
 def setup(bot):
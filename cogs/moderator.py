@@ -1,97 +1,436 @@
 import asyncio
-import collections
 import datetime
+import re
 from contextlib import suppress
-from typing import Optional
+from typing import Awaitable, Callable, List, Optional, Tuple
 
-import asyncpg
 import discord
-from discord.ext import commands, tasks
-from utils.CustomConverters import HierarchyMemberConverter, TimeConverter
+from discord.ext import commands
+from utils.CustomConverters import (
+    DurationConverter,
+    HierarchyMemberConverter,
+    TimeConverter,
+)
+from utils.flags import BaseFlags
 from utils.subclasses import CustomEmbed
+from utils.timers import Timer
+from utils.workers import WorkerPool
 
-POLL_PERIOD = 900
+MASS_LIMIT = 1000
+# Requests in flight at once, the library queues them per rate limit bucket.
+MASS_CONCURRENCY = 8
+# Seconds between edits of the progress message.
+PROGRESS_INTERVAL = 2
+
+PURGE_LIMIT = 100_000
+# Discord only bulk deletes messages younger than this, with some leeway.
+BULK_DELETE_AGE = datetime.timedelta(days=14, minutes=-5)
+BULK_DELETE_SIZE = 100
+# Older messages waiting for the single delete worker, history waits when full.
+OLD_QUEUE_SIZE = 100
+
+
+class MassFlags(BaseFlags):
+    ids: Tuple[int, ...] = ()
+    joined: Optional[DurationConverter] = None
+    created: Optional[DurationConverter] = None
+    regex: Optional[str] = None
+    reason: str = "No reason given"
+
+
+class MassMuteFlags(MassFlags):
+    duration: DurationConverter
+
+
+class PurgeFlags(BaseFlags):
+    limit: int = 100
+    user: Optional[discord.User] = None
+    contains: Optional[str] = None
+    regex: Optional[str] = None
+    attachments: bool = False
+    bots: bool = False
+    embeds: bool = False
+    before: Optional[int] = None
+    after: Optional[int] = None
+
+
+def outranks(ctx, member: discord.Member) -> bool:
+    """The checks HierarchyMemberConverter does, without raising"""
+    return (
+        member != ctx.guild.owner
+        and member != ctx.author
+        and member.top_role < ctx.author.top_role
+        and member.top_role < ctx.me.top_role
+    )
 
 
 class Moderator(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.aliases = ("Mod",)
-        self._queue = collections.deque()
-        self.mute_pull.start()
+        bot.timers.add_reconciler("mute", self.lift_mute, finished=self.forget_mutes)
+
+    async def lift_mute(self, timer: Timer):
+        """Removes the muted role, errors other than missing access propagate"""
+        if (guild := self.bot.get_guild(timer.data["guild_id"])) is None:
+            return
+
+        member = guild.get_member(timer.data["user_id"])
+        role = guild.get_role(timer.data["role_id"])
+
+        if member is None or role is None or role not in member.roles:
+            return
+
+        with suppress(discord.Forbidden, discord.NotFound):
+            await member.remove_roles(role, reason="Mute expired.")
+
+    async def forget_mutes(self, timers: List[Timer]):
+        await self.bot.db.execute(
+            """
+            DELETE FROM mutes
+            WHERE (guildid, userid) IN (
+                SELECT * FROM unnest($1::bigint[], $2::bigint[])
+            )
+            """,
+            [timer.data["guild_id"] for timer in timers],
+            [timer.data["user_id"] for timer in timers],
+        )
+
+    def resolve_targets(
+        self, ctx, flags: MassFlags, *, members_only: bool = True
+    ) -> Tuple[List[discord.abc.Snowflake], int]:
+        """Returns who a mass command targets and how many were left out.
+
+        Every member matching all the given filters is targeted, along with
+        the given ids. Ids of users that aren't members are only kept when
+        `members_only` is False, since they can still be banned.
+        """
+        filters: List[Callable[[discord.Member], bool]] = []
+        now = discord.utils.utcnow()
+
+        if flags.joined is not None:
+            since = now - flags.joined
+            filters.append(lambda m: m.joined_at is not None and m.joined_at >= since)
+        if flags.created is not None:
+            created = now - flags.created
+            filters.append(lambda m: m.created_at >= created)
+        if flags.regex is not None:
+            try:
+                pattern = re.compile(flags.regex)
+            except re.error as e:
+                raise commands.BadArgument(f"That regex is invalid: `{e}`")
+
+            filters.append(
+                lambda m: bool(pattern.search(m.name) or pattern.search(m.display_name))
+            )
+
+        if not filters and not flags.ids:
+            raise commands.BadArgument(
+                "Give some ids or at least one of `--joined`, `--created` and `--regex`."
+            )
+
+        targets = {}
+
+        if filters:
+            for member in ctx.guild.members:
+                if all(check(member) for check in filters):
+                    targets[member.id] = member
+
+        for id in flags.ids:
+            if (member := ctx.guild.get_member(id)) is not None:
+                targets[member.id] = member
+            elif not members_only:
+                targets[id] = discord.Object(id=id)
+
+        allowed = [
+            target
+            for target in targets.values()
+            if not isinstance(target, discord.Member) or outranks(ctx, target)
+        ]
 
-    async def perform_unmute(
+        return allowed, len(targets) - len(allowed)
+
+    async def run_mass(
         self,
-        *,
-        member: discord.Member,
-        role: discord.Role,
-        when: datetime.datetime,
-        record: Optional[int] = None,
-    ):
-        """Sleep and remove the muted role"""
-        await discord.utils.sleep_until(when)
-
-        query = """
-                DELETE FROM mutes
-                WHERE guildId = $1
-                AND userid = $2
-                """
-
-        with suppress(discord.Forbidden):
-            await member.remove_roles(role)
-
-        await self.bot.db.execute(query, member.guild.id, member.id)
-        if record is not None:
-            self._queue.pop(record)
-
-    def unmute_error(self, task: asyncio.Task) -> Optional[str]:
-        """Print our traceback in the event of an error."""
-
-        if task.exception():
-            self.bot.logger.exception(task.exception())
-
-    @tasks.loop(seconds=POLL_PERIOD)
-    async def mute_pull(self):
-        now = datetime.datetime.utcnow()
-        later = now + datetime.timedelta(seconds=POLL_PERIOD)
-
-        query = """
-                SELECT * FROM mutes
-                WHERE guildId = $1
-                AND endtime > $2
-                AND endtime < $3
-                """
-
-        for guild in self.bot.guilds:
-            records: list[asyncpg.Record] = await self.bot.db.fetch(
-                query, guild.id, now, later
-            )
-
-            if not records:
-                return
-
-            for record in records:
-                record_id: int = record["id"]
-                guild: discord.Guild = self.bot.get_guild(record["guildId"])
-                member: discord.Member = guild.get_member(record["userId"])
-                role: discord.Role = guild.get_role(
-                    self.bot.cache[guild.id]["muted_role"]
+        ctx,
+        action: str,
+        targets: List[discord.abc.Snowflake],
+        skipped: int,
+        func: Callable[[discord.abc.Snowflake], Awaitable],
+    ) -> List[discord.abc.Snowflake]:
+        """Confirms, then runs `func` on every target and edits in progress"""
+        hierarchy = (
+            f", skipping {skipped} above you or me in the hierarchy" if skipped else ""
+        )
+
+        if not targets:
+            raise commands.BadArgument(
+                f"Nobody matched that I'm able to {action}{hierarchy}."
+            )
+
+        if len(targets) > MASS_LIMIT:
+            raise commands.BadArgument(
+                f"That matched {len(targets)} users, I can only {action} {MASS_LIMIT} at once."
+            )
+
+        if not await ctx.confirm(
+            embed=CustomEmbed(
+                title=f"Mass {action}",
+                description=(
+                    f"This will {action} {len(targets)} user(s){hierarchy}. "
+                    "Are you sure?"
+                ),
+            )
+        ):
+            return []
+
+        pool = WorkerPool(concurrency=MASS_CONCURRENCY, name=f"Mass {action}")
+        # Keyed per user, the per route rate limits are left to the library.
+        task = self.bot.loop.create_task(pool.run(targets, func, key=lambda t: t.id))
+
+        def progress(title: str) -> CustomEmbed:
+            return CustomEmbed(
+                title=title,
+                description=(
+                    f"Done: {pool.done} / {pool.total}\n"
+                    f"Failed: {pool.failed}\n"
+                    f"Elapsed: {pool.elapsed:.1f}s"
+                ),
+            )
+
+        while not task.done():
+            await ctx.reply(embed=progress(f"Mass {action} in progress"))
+            await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+
+        succeeded = task.result()
+        await ctx.reply(embed=progress(f"Mass {action} finished"))
+
+        return succeeded
+
+    @commands.command()
+    @commands.has_guild_permissions(ban_members=True)
+    @commands.bot_has_guild_permissions(ban_members=True)
+    @commands.max_concurrency(1, commands.BucketType.guild)
+    async def massban(self, ctx, *, flags: MassFlags):
+        """Bans many users at once, without notifying them.
+
+        Flags: `--ids` (users that left can be banned too), `--joined` and `--created` (how long ago, eg: `10m`), `--regex` (matched against names) and `--reason`.
+        Eg: `massban --joined 15m --regex ^spam --reason Raid`
+        """
+        targets, skipped = self.resolve_targets(ctx, flags, members_only=False)
+        reason = f"Mass ban by {ctx.author} [{ctx.author.id}]: {flags.reason}"
+
+        async def ban(target):
+            await ctx.guild.ban(target, reason=reason, delete_message_days=1)
+
+        banned = await self.run_mass(ctx, "ban", targets, skipped, ban)
+        await self.bot.cases.create_many(
+            ctx.guild.id, "ban", (t.id for t in banned), ctx.author.id, flags.reason
+        )
+
+    @commands.command()
+    @commands.has_guild_permissions(kick_members=True)
+    @commands.bot_has_guild_permissions(kick_members=True)
+    @commands.max_concurrency(1, commands.BucketType.guild)
+    async def masskick(self, ctx, *, flags: MassFlags):
+        """Kicks many members at once, without notifying them.
+
+        Flags: `--ids`, `--joined` and `--created` (how long ago, eg: `10m`), `--regex` (matched against names) and `--reason`.
+        Eg: `masskick --created 1d --joined 1h`
+        """
+        targets, skipped = self.resolve_targets(ctx, flags)
+        reason = f"Mass kick by {ctx.author} [{ctx.author.id}]: {flags.reason}"
+
+        async def kick(target):
+            await ctx.guild.kick(target, reason=reason)
+
+        kicked = await self.run_mass(ctx, "kick", targets, skipped, kick)
+        await self.bot.cases.create_many(
+            ctx.guild.id, "kick", (t.id for t in kicked), ctx.author.id, flags.reason
+        )
+
+    @commands.command()
+    @commands.has_guild_permissions(manage_roles=True)
+    @commands.bot_has_guild_permissions(manage_roles=True)
+    @commands.max_concurrency(1, commands.BucketType.guild)
+    async def massmute(self, ctx, *, flags: MassMuteFlags):
+        """Mutes many members at once for `--duration`.
+
+        Flags: `--duration` (required, eg: `6h`), `--ids`, `--joined` and `--created` (how long ago, eg: `10m`), `--regex` (matched against names) and `--reason`.
+        Members that are already muted are left alone.
+        """
+        muted_role = ctx.guild.get_role(ctx.cache.muteid)
+
+        if muted_role is None:
+            raise commands.BadArgument(
+                "I cannot find the muted role in the config, this is probably because the role was deleted or you haven't set it up."
+            )
+
+        if muted_role >= ctx.me.top_role:
+            raise commands.BadArgument(
+                "The muted role is greater than or equal to my top role in the hierarchy, please move my role above it."
+            )
+
+        targets, skipped = self.resolve_targets(ctx, flags)
+        targets = [member for member in targets if muted_role not in member.roles]
+
+        starttime = datetime.datetime.utcnow()
+        endtime = starttime + flags.duration
+        reason = f"Mass mute by {ctx.author} [{ctx.author.id}]: {flags.reason}"
+
+        async def mute(member: discord.Member):
+            # The row exists before the timer can fire and the role before the
+            # timer is made, a failure part way undoes what was done.
+            await ctx.db.execute(
+                "INSERT INTO mutes(userid, guildid, starttime, endtime, reason) VALUES($1, $2, $3, $4, $5)",
+                member.id,
+                ctx.guild.id,
+                starttime,
+                endtime,
+                flags.reason,
+            )
+
+            try:
+                await member.add_roles(muted_role, reason=reason)
+
+                try:
+                    await self.bot.timers.create(
+                        "mute",
+                        endtime,
+                        guild_id=ctx.guild.id,
+                        user_id=member.id,
+                        role_id=muted_role.id,
+                    )
+                except Exception:
+                    await member.remove_roles(muted_role, reason="Mute failed.")
+                    raise
+            except Exception:
+                await ctx.db.execute(
+                    "DELETE FROM mutes WHERE guildid = $1 AND userid = $2",
+                    ctx.guild.id,
+                    member.id,
                 )
+                raise
+
+        muted = await self.run_mass(ctx, "mute", targets, skipped, mute)
+
+        await self.bot.cases.create_many(
+            ctx.guild.id, "mute", (m.id for m in muted), ctx.author.id, flags.reason
+        )
 
-                if role is None or member is None:
+    @commands.command()
+    @commands.guild_only()
+    @commands.has_permissions(manage_messages=True)
+    @commands.bot_has_permissions(manage_messages=True, read_message_history=True)
+    @commands.max_concurrency(1, commands.BucketType.channel)
+    async def purge(self, ctx, *, flags: PurgeFlags):
+        """Deletes messages in this channel matching every given filter.
+
+        Flags: `--limit` (messages searched, default 100), `--user`, `--contains`, `--regex`, `--attachments yes`, `--bots yes`, `--embeds yes` and `--before`/`--after` (message ids).
+        Pinned messages are never deleted. Eg: `purge --limit 500 --bots yes`
+        """
+        if not 0 < flags.limit <= PURGE_LIMIT:
+            raise commands.BadArgument(f"The limit has to be from 1 to {PURGE_LIMIT}.")
+
+        checks: List[Callable[[discord.Message], bool]] = [lambda m: not m.pinned]
+
+        if flags.user is not None:
+            checks.append(lambda m: m.author.id == flags.user.id)
+        if flags.contains is not None:
+            contains = flags.contains.lower()
+            checks.append(lambda m: contains in m.content.lower())
+        if flags.regex is not None:
+            try:
+                pattern = re.compile(flags.regex)
+            except re.error as e:
+                raise commands.BadArgument(f"That regex is invalid: `{e}`")
+
+            checks.append(lambda m: pattern.search(m.content) is not None)
+        if flags.attachments:
+            checks.append(lambda m: bool(m.attachments))
+        if flags.bots:
+            checks.append(lambda m: m.author.bot)
+        if flags.embeds:
+            checks.append(lambda m: bool(m.embeds))
+
+        bulk: List[discord.Message] = []
+        old: "asyncio.Queue[Optional[discord.Message]]" = asyncio.Queue(OLD_QUEUE_SIZE)
+        deleted = {"bulk": 0, "old": 0, "failed": 0}
+
+        async def delete_old():
+            # Single deletes share one rate limit, so one at a time is the ceiling.
+            while (message := await old.get()) is not None:
+                try:
+                    await message.delete()
+                    deleted["old"] += 1
+                except discord.NotFound:
+                    pass
+                except discord.HTTPException:
+                    deleted["failed"] += 1
+
+        def too_old(message: discord.Message) -> bool:
+            return message.created_at < discord.utils.utcnow() - BULK_DELETE_AGE
+
+        async def delete_bulk():
+            # Checked again right before sending, waiting on the old queue
+            # can age a chunk past the limit.
+            cutoff = discord.utils.utcnow() - BULK_DELETE_AGE
+            chunk = [message for message in bulk if message.created_at >= cutoff]
+            aged = [message for message in bulk if message.created_at < cutoff]
+            bulk.clear()
+
+            try:
+                await ctx.channel.delete_messages(chunk)
+                deleted["bulk"] += len(chunk)
+            except discord.HTTPException:
+                deleted["failed"] += len(chunk)
+
+            for message in aged:
+                await old.put(message)
+
+        worker = self.bot.loop.create_task(delete_old())
+
+        try:
+            # Only the current chunk and the queue are ever held, not the history.
+            async for message in ctx.channel.history(
+                limit=flags.limit,
+                before=discord.Object(flags.before) if flags.before else ctx.message,
+                after=discord.Object(flags.after) if flags.after else None,
+            ):
+                if not all(check(message) for check in checks):
                     continue
 
-                when: datetime.datetime = record["enddtime"]
+                if too_old(message):
+                    await old.put(message)
+                    continue
 
-                task = self.bot.loop.create_task(
-                    self.perform_unmute(member=member, role=role, when=when)
-                )
-                task.add_done_callback(self.unmute_error)
-                self._queue.append(record_id)
+                bulk.append(message)
 
-    @mute_pull.before_loop
-    async def before(self):
-        await self.bot.wait_until_ready()
+                if len(bulk) == BULK_DELETE_SIZE:
+                    await delete_bulk()
+
+            if bulk:
+                await delete_bulk()
+
+            await old.put(None)
+            await worker
+        finally:
+            worker.cancel()
+
+        await ctx.reply(
+            embed=CustomEmbed(
+                description=(
+                    f"Deleted {deleted['bulk'] + deleted['old']} message(s), "
+                    f"{deleted['old']} of them older than 14 days."
+                    + (
+                        f"\n{deleted['failed']} couldn't be deleted."
+                        if deleted["failed"]
+                        else ""
+                    )
+                )
+            ),
+            delete_after=30,
+        )
 
     @commands.command()
     @commands.has_guild_permissions(kick_members=True)
@@ -114,19 +453,23 @@ class Moderator(commands.Cog):
             try:
                 await member.kick(reason=reason)
                 notified = False
-                await ctx.reply(
-                    embed=CustomEmbed(
-                        title="Kicked User",
-                        description=f"Kicked member {member.name} for reason `{reason}`. User was {'notified.' if notified is True else 'not notified.'}",
-                    )
-                )
-            except:
+            except discord.HTTPException:
                 return await ctx.send(
                     embed=CustomEmbed(
                         description="I was unable to kick the user for whatever reason."
                     )
                 )
 
+            await self.bot.cases.create(
+                ctx.guild.id, "kick", member.id, ctx.author.id, reason
+            )
+            return await ctx.reply(
+                embed=CustomEmbed(
+                    title="Kicked User",
+                    description=f"Kicked member {member.name} for reason `{reason}`. User was {'notified.' if notified is True else 'not notified.'}",
+                )
+            )
+
         try:
             await member.send(
                 embed=CustomEmbed(
@@ -141,6 +484,9 @@ class Moderator(commands.Cog):
 
         finally:
             await member.kick(reason=reason)
+            await self.bot.cases.create(
+                ctx.guild.id, "kick", member.id, ctx.author.id, reason
+            )
 
             await ctx.reply(
                 embed=CustomEmbed(
@@ -168,19 +514,23 @@ class Moderator(commands.Cog):
             try:
                 await member.ban(reason=reason, delete_message_days=delete)
                 notified = False
-                await ctx.reply(
-                    embed=CustomEmbed(
-                        title="Banned User",
-                        description=f"Banned member {member.name} for reason `{reason}`. User was {'notified.' if notified is True else 'not notified.'}",
-                    )
-                )
-            except:
+            except discord.HTTPException:
                 return await ctx.send(
                     embed=CustomEmbed(
                         description="I was unable to ban the user for whatever reason."
                     )
                 )
 
+            await self.bot.cases.create(
+                ctx.guild.id, "ban", member.id, ctx.author.id, reason
+            )
+            return await ctx.reply(
+                embed=CustomEmbed(
+                    title="Banned User",
+                    description=f"Banned member {member.name} for reason `{reason}`. User was {'notified.' if notified is True else 'not notified.'}",
+                )
+            )
+
         try:
             await member.send(
                 embed=CustomEmbed(
@@ -195,6 +545,9 @@ class Moderator(commands.Cog):
 
         finally:
             await member.ban(reason=reason, delete_message_days=delete)
+            await self.bot.cases.create(
+                ctx.guild.id, "ban", member.id, ctx.author.id, reason
+            )
 
             await ctx.reply(
                 embed=CustomEmbed(
@@ -217,6 +570,9 @@ class Moderator(commands.Cog):
 
         await member.ban(reason=reason)
         await member.unban()
+        await self.bot.cases.create(
+            ctx.guild.id, "softban", member.id, ctx.author.id, reason
+        )
 
         await ctx.reply(
             embed=CustomEmbed(
@@ -240,7 +596,7 @@ class Moderator(commands.Cog):
 
         Valid time specifiers are `d`, `m`, `s`, `h`
         """
-        muted_role = ctx.guild.get_role(ctx.cache.get("muteid"))
+        muted_role = ctx.guild.get_role(ctx.cache.muteid)
 
         if muted_role is None:
             raise commands.BadArgument(
@@ -264,15 +620,11 @@ class Moderator(commands.Cog):
                 ctx.guild.id,
                 member.id,
             )
-        sleep = (time - datetime.datetime.utcnow()).total_seconds()
-        if sleep <= 1800:
-            task = self.bot.loop.create_task(
-                self.perform_unmute(
-                    member=member, role=muted_role, when=time, record=None
-                )
+            await self.bot.timers.cancel(
+                "mute", guild_id=ctx.guild.id, user_id=member.id
             )
-            task.add_done_callback(self.unmute_error)
 
+        # Same order as massmute, a failure part way undoes what was done.
         await ctx.db.execute(
             "INSERT INTO mutes(userid, guildid, starttime, endtime, reason) VALUES($1, $2, $3, $4, $5)",
             member.id,
@@ -282,8 +634,32 @@ class Moderator(commands.Cog):
             reason,
         )
 
-        await member.add_roles(
-            muted_role, reason=f"Mute done by {ctx.author} [{ctx.author.id}]"
+        try:
+            await member.add_roles(
+                muted_role, reason=f"Mute done by {ctx.author} [{ctx.author.id}]"
+            )
+
+            try:
+                await self.bot.timers.create(
+                    "mute",
+                    time,
+                    guild_id=ctx.guild.id,
+                    user_id=member.id,
+                    role_id=muted_role.id,
+                )
+            except Exception:
+                await member.remove_roles(muted_role, reason="Mute failed.")
+                raise
+        except Exception:
+            await ctx.db.execute(
+                "DELETE FROM mutes WHERE guildid = $1 AND userid = $2",
+                ctx.guild.id,
+                member.id,
+            )
+            raise
+
+        await self.bot.cases.create(
+            ctx.guild.id, "mute", member.id, ctx.author.id, reason
         )
 
         await ctx.reply(
@@ -301,7 +677,7 @@ class Moderator(commands.Cog):
         Unmutes a member.
         """
 
-        muted_role = ctx.guild.get_role(ctx.cache.get("muteid"))
+        muted_role = ctx.guild.get_role(ctx.cache.muteid)
 
         if muted_role is None:
             raise commands.BadArgument(
@@ -322,6 +698,12 @@ class Moderator(commands.Cog):
                 member.id,
                 ctx.guild.id,
             )
+            await self.bot.timers.cancel(
+                "mute", guild_id=ctx.guild.id, user_id=member.id
+            )
+            await self.bot.cases.create(
+                ctx.guild.id, "unmute", member.id, ctx.author.id
+            )
             await ctx.reply(embed=CustomEmbed(description=f"Unmuted {member}"))
 
         else:
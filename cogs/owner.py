@@ -1,9 +1,12 @@
-from typing import Union
+from datetime import datetime, timezone
+from typing import Optional, Union
 
 import discord
 from discord.ext import commands
 from discord.member import Member
 from discord.user import User
+from utils.blacklist import BlacklistEntry
+from utils.CustomConverters import TimeConverter
 from utils.subclasses import CustomEmbed, HarleyContext
 
 
@@ -116,32 +119,112 @@ class Owner(commands.Cog, command_attrs=dict(hidden=True)):
         await ctx.message.add_reaction("\U0001f44b")
         await ctx.bot.close()
 
+    @commands.is_owner()
+    @dev.command(aliases=("logqueue",))
+    async def logstats(self, ctx):
+        """Shows the log queues, what's waiting and what was summarized"""
+        stats = self.bot.log_scheduler.stats()
+
+        deepest = "\n".join(
+            f"{self.bot.get_guild(id) or id} - {depth}"
+            for id, depth in stats["deepest"]
+        )
+
+        await ctx.reply(
+            embed=CustomEmbed(
+                title="Log Queues",
+                description=(
+                    "```\n"
+                    f"Queued: {stats['queued']} across {stats['guilds']} guild(s)\n"
+                    f"Summarizing: {stats['summarizing']}\n"
+                    f"Waiting on audit logs: {stats['parked']}\n"
+                    f"Processed: {stats['processed']}\n"
+                    f"Shed: {stats['shed']}\n"
+                    f"Summaries sent: {stats['summaries']}\n"
+                    "```"
+                ),
+            ).add_field(name="Deepest Queues", value=deepest or "None")
+        )
+
     @commands.is_owner()
     @dev.command()
-    async def blacklist(
-        self, ctx, user: Union[Member, User], *, reason: str = "None Given"
+    async def timers(self, ctx):
+        """Shows pending timers and how the startup reconciliation went"""
+        timers = self.bot.timers
+
+        embed = CustomEmbed(
+            title="Timers",
+            description=f"In memory: {len(timers)}\nFired: {timers.fired}",
+        )
+
+        for event, pool in timers.reconciliations.items():
+            stats = pool.stats()
+            embed.add_field(
+                name=f"Reconciled `{event}`",
+                value=(
+                    f"{stats['done'] + stats['failed']} / {stats['total']} "
+                    f"({stats['failed']} failed) in {stats['elapsed']}s"
+                    + (" - running" if stats["running"] else "")
+                ),
+            )
+
+        await ctx.reply(embed=embed)
+
+    async def _blacklist(
+        self, ctx, id: int, reason: str, expires_at: Optional[datetime] = None
     ):
         try:
-            await self.bot.db.execute(
-                "INSERT INTO blacklist(id, reason) VALUES($1, $2)", user.id, reason
+            record = await self.bot.db.fetchrow(
+                """
+                INSERT INTO blacklist(id, reason, expires_at) VALUES($1, $2, $3)
+                ON CONFLICT (id) DO UPDATE
+                SET reason = EXCLUDED.reason, expires_at = EXCLUDED.expires_at
+                RETURNING *
+                """,
+                id,
+                reason,
+                expires_at,
             )
+            self.bot.blacklist.add(BlacklistEntry.from_record(record))
             await ctx.message.add_reaction("\U0001f44d")
         except:
             await ctx.message.add_reaction("\U0001f44e")
 
-        record = await self.bot.db.fetchrow(
-            "SELECT * FROM blacklist WHERE id = $1", user.id
-        )
+    @commands.is_owner()
+    @dev.command()
+    async def blacklist(
+        self, ctx, user: Union[Member, User], *, reason: str = "None Given"
+    ):
+        await self._blacklist(ctx, user.id, reason)
+
+    @commands.is_owner()
+    @dev.command(aliases=("tempbl",))
+    async def tempblacklist(
+        self,
+        ctx,
+        user: Union[Member, User],
+        time: TimeConverter,
+        *,
+        reason: str = "None Given",
+    ):
+        """Blacklists a user until the given time, eg `6h`"""
+        await self._blacklist(ctx, user.id, reason, time.replace(tzinfo=timezone.utc))
 
-        self.bot.blacklisted.update({record["id"]: record["reason"]})
+    @commands.is_owner()
+    @dev.command(aliases=("guildbl",))
+    async def blacklistguild(
+        self, ctx, guild: discord.Object, *, reason: str = "None Given"
+    ):
+        """Ignores every command run in the given guild"""
+        await self._blacklist(ctx, guild.id, reason)
 
     @commands.is_owner()
     @dev.command()
-    async def unblacklist(self, ctx, user: Union[Member, User]):
+    async def unblacklist(self, ctx, user: Union[Member, User, discord.Object]):
         try:
             await self.bot.db.execute("DELETE FROM blacklist WHERE id = $1", user.id)
             await ctx.message.add_reaction("\U0001f44d")
-            self.bot.blacklisted.pop(user.id)
+            self.bot.blacklist.remove(user.id)
         except:
             await ctx.message.add_reaction("\U0001f44e")
 
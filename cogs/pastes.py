@@ -0,0 +1,81 @@
+import html
+import logging
+
+from aiohttp import web
+from discord.ext import commands, tasks
+from utils.paste import LocalBackend
+from utils.subclasses import HarleyBot
+
+DEFAULT_RETENTION = 30
+
+
+class Pastes(commands.Cog):
+    """Serves pastes stored by the local paste backend."""
+
+    def __init__(self, bot: HarleyBot):
+        self.bot: HarleyBot = bot
+        self.config = bot.config.get("paste", {})
+        self.runner: web.AppRunner = None
+        self.logger = logging.getLogger("Pastes")
+
+        if isinstance(bot.pastes.backend, LocalBackend):
+            self.backend: LocalBackend = bot.pastes.backend
+            bot.loop.create_task(self.start_server())
+            self.prune.start()
+
+    def cog_unload(self):
+        self.prune.cancel()
+
+        if self.runner is not None:
+            self.bot.loop.create_task(self.runner.cleanup())
+
+    async def start_server(self):
+        app = web.Application()
+        app.router.add_get("/paste/{id}", self.get_paste)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+
+        site = web.TCPSite(
+            self.runner,
+            self.config.get("host", "0.0.0.0"),
+            self.config.get("port", 8080),
+        )
+        await site.start()
+
+        self.logger.info(f"Serving pastes on {site.name}")
+
+    async def get_paste(self, request: web.Request) -> web.Response:
+        paste = await self.backend.get(request.match_info["id"])
+
+        if paste is None:
+            raise web.HTTPNotFound()
+
+        text, syntax = paste
+
+        if "raw" in request.query:
+            return web.Response(text=text, content_type="text/plain")
+
+        return web.Response(
+            text=(
+                "<!DOCTYPE html><html><head><meta charset='utf-8'></head><body>"
+                f"<pre><code class='language-{html.escape(syntax or 'text')}'>"
+                f"{html.escape(text)}</code></pre></body></html>"
+            ),
+            content_type="text/html",
+        )
+
+    @tasks.loop(hours=12)
+    async def prune(self):
+        status = await self.backend.prune(
+            self.config.get("retention_days", DEFAULT_RETENTION)
+        )
+        self.logger.info(f"Pruned old pastes: {status}")
+
+    @prune.before_loop
+    async def before_prune(self):
+        await self.bot.db_ready.wait()
+
+
+def setup(bot):
+    bot.add_cog(Pastes(bot))
@@ -1,9 +1,19 @@
+import json
 import re
+from datetime import datetime, timezone
+from typing import List, Optional
 
 import discord
 from discord.ext import commands
 from discord.ext.commands.errors import RoleNotFound
-from utils import OptionsConverter, LoggingEnum, Embed as CustomEmbed
+from utils import (
+    BaseFlags,
+    DurationConverter,
+    OptionsConverter,
+    LoggingEnum,
+    Embed as CustomEmbed,
+)
+from utils.pagination import KeysetPages, KeysetPageSource
 from utils.utils import title_format
 
 NEWLINE = "\n"
@@ -41,6 +51,119 @@ class MuteRoleConverter(commands.Converter):
             raise e
 
 
+class LogSearchFlags(BaseFlags):
+    user: Optional[discord.User] = None
+    category: Optional[OptionsConverter] = None
+    since: Optional[DurationConverter] = None
+    until: Optional[DurationConverter] = None
+    text: Optional[str] = None
+
+
+class LogSearchSource(KeysetPageSource):
+    """Stored log events, newest first, keyed on (created_at, id)"""
+
+    def __init__(self, bot, guild_id: int, flags: LogSearchFlags):
+        super().__init__(per_page=5)
+        self.bot = bot
+
+        now = datetime.now(timezone.utc)
+        self.conditions = ["guild_id = $1"]
+        self.args = [guild_id]
+        self.user_id = getattr(flags.user, "id", None)
+
+        if flags.category is not None:
+            self.add_condition("category = ${0}", flags.category.name)
+        if flags.since is not None:
+            self.add_condition("created_at >= ${0}", now - flags.since)
+        if flags.until is not None:
+            self.add_condition("created_at < ${0}", now - flags.until)
+        if flags.text:
+            self.add_condition(
+                "search @@ websearch_to_tsquery('english', ${0})", flags.text
+            )
+
+    def add_condition(self, condition: str, value):
+        self.args.append(value)
+        self.conditions.append(condition.format(len(self.args)))
+
+    async def fetch(self, after, limit):
+        conditions = list(self.conditions)
+        args = list(self.args)
+
+        if after is not None:
+            args.extend(after)
+            conditions.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+
+        if self.user_id is None:
+            return await self.bot.db.fetch(self.select(conditions, limit), *args)
+
+        args.append(self.user_id)
+        user = f"${len(args)}"
+
+        # An OR of the two columns can't walk either index in order, so each
+        # side gets its own ordered scan and only the first pages are merged.
+        actor = self.select([*conditions, f"actor_id = {user}"], limit)
+        target = self.select(
+            [*conditions, f"target_id = {user}", f"actor_id IS DISTINCT FROM {user}"],
+            limit,
+        )
+
+        query = f"""
+                ({actor}) UNION ALL ({target})
+                ORDER BY created_at DESC, id DESC
+                LIMIT {limit}
+                """
+
+        return await self.bot.db.fetch(query, *args)
+
+    def select(self, conditions: List[str], limit: int) -> str:
+        return f"""
+                SELECT id, category, actor_id, target_id, payload, created_at
+                FROM log_events
+                WHERE {" AND ".join(conditions)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT {limit}
+                """
+
+    def key(self, entry):
+        return entry["created_at"], entry["id"]
+
+    def format_page(self, menu, entries):
+        embed = CustomEmbed(title="Log Search")
+
+        if not entries:
+            embed.description = "No logs matched."
+
+        for entry in entries:
+            payload = json.loads(entry["payload"])
+            users = " ".join(
+                f"{name}: <@{entry[column]}>"
+                for name, column in (("By", "actor_id"), ("On", "target_id"))
+                if entry[column] is not None
+            )
+
+            details = payload.get("description") or NEWLINE.join(
+                field["value"] for field in payload.get("fields", ())
+            )
+
+            embed.add_field(
+                name=(
+                    f"{payload.get('title', 'Log').strip('*')} "
+                    f"[{title_format(entry['category'])}]"
+                ),
+                value=(
+                    f"<t:{int(entry['created_at'].timestamp())}:f> {users}\n"
+                    f"{details[:200]}"
+                ),
+                inline=False,
+            )
+
+        max_pages = self.get_max_pages()
+        embed.set_footer(text=f"Page {menu.current_page + 1} / {max_pages or '?'}")
+
+        return embed
+
+
 class Settings(commands.Cog):
     """A module that deals with the configuration of the bot"""
 
@@ -52,10 +175,7 @@ class Settings(commands.Cog):
     @commands.guild_only()
     async def prefix(self, ctx, prefix: PrefixConverter):
         """Sets the guilds prefix, use quotes to get spaces in the prefix. Eg: `prefix "harley "`"""
-        await self.bot.db.execute(
-            "UPDATE config SET prefix = $1 WHERE id = $2", prefix, ctx.guild.id
-        )
-        await self.bot.refresh_cache_for(ctx.guild.id)
+        await self.bot.cache.update(ctx.guild.id, prefix=prefix)
 
         await ctx.reply(
             embed=CustomEmbed(description=f"Successfully set prefix to `{prefix}`")
@@ -79,10 +199,7 @@ class Settings(commands.Cog):
         if not channel.permissions_for(ctx.me).send_messages:
             raise commands.BadArgument("I cannot send messages there!")
 
-        await self.bot.db.execute(
-            "UPDATE config SET logid = $2 WHERE id = $1", ctx.guild.id, channel.id
-        )
-        await self.bot.refresh_cache_for(ctx.guild.id)
+        await self.bot.cache.update(ctx.guild.id, logid=channel.id)
 
         await ctx.reply(
             embed=CustomEmbed(description=f"Set log channel to {channel.mention}.")
@@ -108,9 +225,7 @@ class Settings(commands.Cog):
         """
         settings = LoggingEnum(sum(options))
 
-        await self.bot.db.execute(
-            "UPDATE config SET options = $2 WHERE id = $1", ctx.guild.id, bin(settings)
-        )
+        await self.bot.cache.update(ctx.guild.id, options=bin(settings))
 
         await ctx.reply(
             embed=CustomEmbed(
@@ -123,7 +238,54 @@ class Settings(commands.Cog):
             )
         )
 
-        await self.bot.refresh_cache_for(ctx.guild.id)
+    @log_group.command(name="route")
+    @commands.has_guild_permissions(manage_guild=True)
+    @commands.guild_only()
+    async def log_route(
+        self,
+        ctx,
+        option: OptionsConverter,
+        channel: Optional[discord.TextChannel] = None,
+    ):
+        """Sends one logging option to its own channel.
+
+        Leave out the channel to send it back to the main log channel.
+        Eg: `log route moderation #mod-logs`
+        """
+        if option is LoggingEnum.NONE:
+            raise commands.BadArgument("`None` cannot be routed.")
+
+        logoptions = dict(ctx.cache.logoptions)
+
+        if channel is None:
+            logoptions.pop(option.name, None)
+        elif not channel.permissions_for(ctx.me).send_messages:
+            raise commands.BadArgument("I cannot send messages there!")
+        else:
+            logoptions[option.name] = channel.id
+
+        await self.bot.cache.update(ctx.guild.id, logoptions=json.dumps(logoptions))
+
+        await ctx.reply(
+            embed=CustomEmbed(
+                description=(
+                    f"{title_format(option.name)} logs now go to "
+                    f"{channel.mention if channel else 'the log channel'}."
+                )
+            )
+        )
+
+    @log_group.command(name="search")
+    @commands.has_guild_permissions(manage_guild=True)
+    @commands.guild_only()
+    async def log_search(self, ctx, *, flags: LogSearchFlags):
+        """Searches this server's stored logs, newest first.
+
+        Flags: `--user`, `--category`, `--since` and `--until` (how long ago, eg: `2d`) and `--text`.
+        Eg: `log search --user @someone --category moderation --since 7d`
+        """
+        menu = KeysetPages(LogSearchSource(self.bot, ctx.guild.id, flags))
+        await menu.start(ctx)
 
     @log_group.command(name="remove")
     @commands.has_guild_permissions(manage_guild=True)
@@ -131,10 +293,7 @@ class Settings(commands.Cog):
     async def remove_log(self, ctx):
         """Removes the log channel"""
 
-        await self.bot.db.execute(
-            "UPDATE config SET logid = $2 WHERE id = $1", ctx.guild.id, None
-        )
-        await self.bot.refresh_cache_for(ctx.guild.id)
+        await self.bot.cache.update(ctx.guild.id, logid=None)
 
         await ctx.reply(embed=CustomEmbed(description="Removed log channel."))
 
@@ -142,8 +301,8 @@ class Settings(commands.Cog):
     @commands.has_guild_permissions(manage_guild=True)
     @commands.guild_only()
     async def log_info(self, ctx):
-        channel = ctx.guild.get_channel(ctx.cache["logid"])
-        options = self.bot.utils.get_enum(ctx.guild.id)
+        channel = ctx.guild.get_channel(ctx.cache.logid)
+        options = ctx.cache.options
 
         channel_info = (
             f"{getattr(channel, 'mention')}" + f" [{getattr(channel, 'id')}]"
@@ -160,6 +319,16 @@ class Settings(commands.Cog):
                 "```"
             ),
         )
+
+        if routes := ctx.cache.routes:
+            embed.add_field(
+                name="Routes",
+                value=NEWLINE.join(
+                    f"{title_format(category.name)} - <#{channel_id}>"
+                    for category, channel_id in routes.items()
+                ),
+            )
+
         await ctx.reply(embed=embed)
 
     @commands.group(name="set")
@@ -178,9 +347,7 @@ class Settings(commands.Cog):
         ``Note``: This role has the `send messages` and `add reactions` permissions taken away.
         """
         try:
-            await self.bot.db.execute(
-                "UPDATE config SET muteId = $2 WHERE id = $1", ctx.guild.id, role.id
-            )
+            await self.bot.cache.update(ctx.guild.id, muteid=role.id)
         except Exception as e:
             raise e
         else:
@@ -196,8 +363,6 @@ class Settings(commands.Cog):
 
         await role.edit(permissions=permissions, reason="Done automatically.")
 
-        await ctx.refresh()
-
     @commands.command()
     @commands.has_guild_permissions(manage_guild=True)
     @commands.guild_only()
@@ -206,22 +371,22 @@ class Settings(commands.Cog):
 
         cache = ctx.cache
 
-        muted_role = ctx.get_role(cache["muteid"])
-        log_channel = ctx.get_channel(cache["logid"])
+        muted_role = ctx.get_role(cache.muteid)
+        log_channel = ctx.get_channel(cache.logid)
 
         options = CODEBLOCK_WITH_SYNTAX.format(
             "diff",
             "\n".join(
                 [
                     f"+ {title_format(option)}"
-                    for option in list(self.bot.utils.get_enum(ctx.guild.id))
+                    for option in list(cache.options)
                 ]
             ),
         )
 
         embed = CustomEmbed(
             description=(
-                f"Prefix: `{cache['prefix']}`\n"
+                f"Prefix: `{cache.prefix}`\n"
                 f"Muted Role: {getattr(muted_role, 'mention', 'None')}\n"
                 f"Log Channel: {getattr(log_channel, 'mention', 'None')}\n"
                 f"Log Options: \n {options}\n"
@@ -4,7 +4,8 @@
 
 CREATE TABLE public.blacklist (
     id bigint NOT NULL,
-    reason text
+    reason text,
+    expires_at timestamp with time zone
 );
 
 
@@ -22,7 +23,8 @@ CREATE TABLE public.config (
     joinmsg text,
     logoptions json,
     options text,
-    muteid bigint
+    muteid bigint,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL
 );
 
 
@@ -99,3 +101,212 @@ ALTER TABLE ONLY public.blacklist
 
 ALTER TABLE ONLY public.config
     ADD CONSTRAINT config_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: pastes; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.pastes (
+    id text NOT NULL,
+    syntax text,
+    content bytea NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+
+ALTER TABLE public.pastes OWNER TO postgres;
+
+ALTER TABLE ONLY public.pastes
+    ADD CONSTRAINT pastes_pkey PRIMARY KEY (id);
+
+CREATE INDEX pastes_created_at_idx ON public.pastes USING btree (created_at);
+
+
+--
+-- Name: log_events; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.log_events (
+    id bigserial NOT NULL,
+    guild_id bigint NOT NULL,
+    category text NOT NULL,
+    actor_id bigint,
+    target_id bigint,
+    payload jsonb NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    search tsvector GENERATED ALWAYS AS (jsonb_to_tsvector('english'::regconfig, payload, '["string"]'::jsonb)) STORED
+) PARTITION BY RANGE (created_at);
+
+
+ALTER TABLE public.log_events OWNER TO postgres;
+
+ALTER TABLE ONLY public.log_events
+    ADD CONSTRAINT log_events_pkey PRIMARY KEY (id, created_at);
+
+-- These end in the (created_at, id) keyset the log search pages with.
+CREATE INDEX log_events_guild_created_at_idx ON public.log_events USING btree (guild_id, created_at, id);
+
+CREATE INDEX log_events_guild_actor_idx ON public.log_events USING btree (guild_id, actor_id, created_at, id);
+
+CREATE INDEX log_events_guild_target_idx ON public.log_events USING btree (guild_id, target_id, created_at, id);
+
+CREATE INDEX log_events_search_idx ON public.log_events USING gin (search);
+
+-- Monthly partitions are created by the bot as needed, this catches anything else.
+CREATE TABLE public.log_events_default PARTITION OF public.log_events DEFAULT;
+
+
+--
+-- Name: timers; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.timers (
+    id bigserial NOT NULL,
+    event text NOT NULL,
+    expires_at timestamp with time zone NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    data jsonb DEFAULT '{}'::jsonb NOT NULL
+);
+
+
+ALTER TABLE public.timers OWNER TO postgres;
+
+ALTER TABLE ONLY public.timers
+    ADD CONSTRAINT timers_pkey PRIMARY KEY (id);
+
+CREATE INDEX timers_expires_at_idx ON public.timers USING btree (expires_at);
+
+CREATE INDEX timers_data_idx ON public.timers USING gin (data jsonb_path_ops);
+
+
+--
+-- Name: case_counters; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.case_counters (
+    guild_id bigint NOT NULL,
+    last_case integer NOT NULL
+);
+
+
+ALTER TABLE public.case_counters OWNER TO postgres;
+
+ALTER TABLE ONLY public.case_counters
+    ADD CONSTRAINT case_counters_pkey PRIMARY KEY (guild_id);
+
+
+--
+-- Name: cases; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.cases (
+    guild_id bigint NOT NULL,
+    case_id integer NOT NULL,
+    action text NOT NULL,
+    user_id bigint NOT NULL,
+    moderator_id bigint NOT NULL,
+    reason text,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    edited_at timestamp with time zone
+);
+
+
+ALTER TABLE public.cases OWNER TO postgres;
+
+ALTER TABLE ONLY public.cases
+    ADD CONSTRAINT cases_pkey PRIMARY KEY (guild_id, case_id);
+
+CREATE INDEX cases_user_idx ON public.cases USING btree (guild_id, user_id, case_id);
+
+CREATE INDEX cases_moderator_idx ON public.cases USING btree (guild_id, moderator_id, case_id) INCLUDE (action, created_at);
+
+
+--
+-- Name: touch_updated_at; Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.touch_updated_at() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.touch_updated_at() OWNER TO postgres;
+
+--
+-- Name: notify_config_change; Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.notify_config_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('config_changed', jsonb_build_object('op', TG_OP, 'id', OLD.id)::text);
+        RETURN OLD;
+    END IF;
+
+    -- joinmsg is unbounded and unused by the cache, keep the payload under the NOTIFY limit.
+    PERFORM pg_notify(
+        'config_changed',
+        jsonb_build_object('op', TG_OP, 'id', NEW.id, 'row', to_jsonb(NEW) - 'joinmsg')::text
+    );
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.notify_config_change() OWNER TO postgres;
+
+--
+-- Name: notify_blacklist_change; Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.notify_blacklist_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('blacklist_changed', jsonb_build_object('op', TG_OP, 'id', OLD.id)::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify(
+        'blacklist_changed',
+        jsonb_build_object(
+            'op', TG_OP,
+            'id', NEW.id,
+            'row', to_jsonb(NEW) || jsonb_build_object('reason', left(NEW.reason, 2000))
+        )::text
+    );
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.notify_blacklist_change() OWNER TO postgres;
+
+--
+-- Name: config config_touch; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER config_touch BEFORE UPDATE ON public.config FOR EACH ROW EXECUTE FUNCTION public.touch_updated_at();
+
+
+--
+-- Name: config config_notify; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER config_notify AFTER INSERT OR DELETE OR UPDATE ON public.config FOR EACH ROW EXECUTE FUNCTION public.notify_config_change();
+
+
+--
+-- Name: blacklist blacklist_notify; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER blacklist_notify AFTER INSERT OR DELETE OR UPDATE ON public.blacklist FOR EACH ROW EXECUTE FUNCTION public.notify_blacklist_change();
@@ -0,0 +1,219 @@
+--
+-- Upgrades a database made from an older schema.sql, fresh installs don't need it.
+-- Every statement is safe to run again: psql -f upgrade.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.config ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone DEFAULT now() NOT NULL;
+
+ALTER TABLE public.blacklist ADD COLUMN IF NOT EXISTS expires_at timestamp with time zone;
+
+CREATE TABLE IF NOT EXISTS public.pastes (
+    id text NOT NULL,
+    syntax text,
+    content bytea NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+
+ALTER TABLE public.pastes OWNER TO postgres;
+
+DO $$
+BEGIN
+    ALTER TABLE ONLY public.pastes ADD CONSTRAINT pastes_pkey PRIMARY KEY (id);
+EXCEPTION WHEN duplicate_table OR invalid_table_definition THEN NULL;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS pastes_created_at_idx ON public.pastes USING btree (created_at);
+
+CREATE TABLE IF NOT EXISTS public.log_events (
+    id bigserial NOT NULL,
+    guild_id bigint NOT NULL,
+    category text NOT NULL,
+    actor_id bigint,
+    target_id bigint,
+    payload jsonb NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    search tsvector GENERATED ALWAYS AS (jsonb_to_tsvector('english'::regconfig, payload, '["string"]'::jsonb)) STORED
+) PARTITION BY RANGE (created_at);
+
+
+ALTER TABLE public.log_events OWNER TO postgres;
+
+DO $$
+BEGIN
+    ALTER TABLE ONLY public.log_events ADD CONSTRAINT log_events_pkey PRIMARY KEY (id, created_at);
+EXCEPTION WHEN duplicate_table OR invalid_table_definition THEN NULL;
+END;
+$$;
+
+-- These end in the (created_at, id) keyset the log search pages with.
+CREATE INDEX IF NOT EXISTS log_events_guild_created_at_idx ON public.log_events USING btree (guild_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS log_events_guild_actor_idx ON public.log_events USING btree (guild_id, actor_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS log_events_guild_target_idx ON public.log_events USING btree (guild_id, target_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS log_events_search_idx ON public.log_events USING gin (search);
+
+CREATE TABLE IF NOT EXISTS public.log_events_default PARTITION OF public.log_events DEFAULT;
+
+CREATE TABLE IF NOT EXISTS public.timers (
+    id bigserial NOT NULL,
+    event text NOT NULL,
+    expires_at timestamp with time zone NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    data jsonb DEFAULT '{}'::jsonb NOT NULL
+);
+
+
+ALTER TABLE public.timers OWNER TO postgres;
+
+DO $$
+BEGIN
+    ALTER TABLE ONLY public.timers ADD CONSTRAINT timers_pkey PRIMARY KEY (id);
+EXCEPTION WHEN duplicate_table OR invalid_table_definition THEN NULL;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS timers_expires_at_idx ON public.timers USING btree (expires_at);
+
+CREATE INDEX IF NOT EXISTS timers_data_idx ON public.timers USING gin (data jsonb_path_ops);
+
+CREATE TABLE IF NOT EXISTS public.case_counters (
+    guild_id bigint NOT NULL,
+    last_case integer NOT NULL
+);
+
+
+ALTER TABLE public.case_counters OWNER TO postgres;
+
+DO $$
+BEGIN
+    ALTER TABLE ONLY public.case_counters ADD CONSTRAINT case_counters_pkey PRIMARY KEY (guild_id);
+EXCEPTION WHEN duplicate_table OR invalid_table_definition THEN NULL;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.cases (
+    guild_id bigint NOT NULL,
+    case_id integer NOT NULL,
+    action text NOT NULL,
+    user_id bigint NOT NULL,
+    moderator_id bigint NOT NULL,
+    reason text,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    edited_at timestamp with time zone
+);
+
+
+ALTER TABLE public.cases OWNER TO postgres;
+
+DO $$
+BEGIN
+    ALTER TABLE ONLY public.cases ADD CONSTRAINT cases_pkey PRIMARY KEY (guild_id, case_id);
+EXCEPTION WHEN duplicate_table OR invalid_table_definition THEN NULL;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS cases_user_idx ON public.cases USING btree (guild_id, user_id, case_id);
+
+CREATE INDEX IF NOT EXISTS cases_moderator_idx ON public.cases USING btree (guild_id, moderator_id, case_id) INCLUDE (action, created_at);
+
+CREATE OR REPLACE FUNCTION public.touch_updated_at() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.touch_updated_at() OWNER TO postgres;
+
+--
+-- Name: notify_config_change; Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE OR REPLACE FUNCTION public.notify_config_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('config_changed', jsonb_build_object('op', TG_OP, 'id', OLD.id)::text);
+        RETURN OLD;
+    END IF;
+
+    -- joinmsg is unbounded and unused by the cache, keep the payload under the NOTIFY limit.
+    PERFORM pg_notify(
+        'config_changed',
+        jsonb_build_object('op', TG_OP, 'id', NEW.id, 'row', to_jsonb(NEW) - 'joinmsg')::text
+    );
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.notify_config_change() OWNER TO postgres;
+
+--
+-- Name: notify_blacklist_change; Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE OR REPLACE FUNCTION public.notify_blacklist_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('blacklist_changed', jsonb_build_object('op', TG_OP, 'id', OLD.id)::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify(
+        'blacklist_changed',
+        jsonb_build_object(
+            'op', TG_OP,
+            'id', NEW.id,
+            'row', to_jsonb(NEW) || jsonb_build_object('reason', left(NEW.reason, 2000))
+        )::text
+    );
+    RETURN NEW;
+END;
+$$;
+
+
+ALTER FUNCTION public.notify_blacklist_change() OWNER TO postgres;
+
+DROP TRIGGER IF EXISTS config_touch ON public.config;
+CREATE TRIGGER config_touch BEFORE UPDATE ON public.config FOR EACH ROW EXECUTE FUNCTION public.touch_updated_at();
+
+DROP TRIGGER IF EXISTS config_notify ON public.config;
+CREATE TRIGGER config_notify AFTER INSERT OR DELETE OR UPDATE ON public.config FOR EACH ROW EXECUTE FUNCTION public.notify_config_change();
+
+DROP TRIGGER IF EXISTS blacklist_notify ON public.blacklist;
+CREATE TRIGGER blacklist_notify AFTER INSERT OR DELETE OR UPDATE ON public.blacklist FOR EACH ROW EXECUTE FUNCTION public.notify_blacklist_change();
+
+--
+-- Mutes used to be lifted by polling the mutes table, they're timers now.
+-- Give every mute without one a timer, overdue ones are lifted on startup.
+-- endtime is naive UTC. Mutes in guilds without a muted role can't be lifted.
+--
+
+INSERT INTO public.timers (event, expires_at, data)
+SELECT 'mute',
+       m.endtime AT TIME ZONE 'UTC',
+       jsonb_build_object('guild_id', m.guildid, 'user_id', m.userid, 'role_id', c.muteid)
+FROM public.mutes m
+JOIN public.config c ON c.id = m.guildid
+WHERE m.endtime IS NOT NULL
+  AND c.muteid IS NOT NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM public.timers t
+      WHERE t.event = 'mute'
+        AND t.data @> jsonb_build_object('guild_id', m.guildid, 'user_id', m.userid)
+  );
+
+COMMIT;
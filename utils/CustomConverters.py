@@ -40,8 +40,8 @@ time_regex = re.compile(r"(\d{1,5}(?:[.,]?\d{1,5})?)([smhd])")
 time_dict = {"h": 3600, "s": 1, "m": 60, "d": 86400}
 
 
-class TimeConverter(commands.Converter):
-    async def convert(self, ctx, argument) -> datetime.datetime:
+class DurationConverter(commands.Converter):
+    async def convert(self, ctx, argument) -> datetime.timedelta:
         matches = time_regex.findall(argument.lower())
         time = 0
         for v, k in matches:
@@ -53,7 +53,14 @@ class TimeConverter(commands.Converter):
                 )
             except ValueError:
                 raise commands.BadArgument("{} is not a number!".format(v))
-        return datetime.datetime.utcnow() + datetime.timedelta(seconds=time)
+        return datetime.timedelta(seconds=time)
+
+
+class TimeConverter(commands.Converter):
+    async def convert(self, ctx, argument) -> datetime.datetime:
+        return datetime.datetime.utcnow() + await DurationConverter().convert(
+            ctx, argument
+        )
 
 
 class OptionsConverter(commands.Converter):
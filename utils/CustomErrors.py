@@ -5,3 +5,10 @@ class Blacklisted(commands.CheckFailure):
     """User is blacklisted"""
 
     pass
+
+
+class DatabaseUnavailable(commands.CommandError):
+    """Postgres isn't connected yet"""
+
+    def __init__(self):
+        super().__init__("I'm still connecting to my database, try again shortly.")
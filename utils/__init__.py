@@ -1,5 +1,10 @@
 from .BaseEmbed import CustomEmbed as Embed
-from .CustomConverters import OptionsConverter, TimeConverter, HierarchyMemberConverter
+from .CustomConverters import (
+    DurationConverter,
+    HierarchyMemberConverter,
+    OptionsConverter,
+    TimeConverter,
+)
 from .CustomErrors import Blacklisted
 from .enums import AutomodEnum, LoggingEnum
 from .flags import BaseFlags
@@ -0,0 +1,156 @@
+import asyncio
+import collections
+import contextvars
+from datetime import timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+import discord
+
+BATCH_WINDOW = 0.75
+FETCH_LIMIT = 50
+CACHE_SIZE = 100
+MAX_AGE = 30
+
+_Key = Tuple[discord.AuditLogAction, Optional[int]]
+
+# Loop time the event being handled was received at, set by the LogScheduler.
+# A fetch issued after it already saw any entry it has, so a miss is final.
+event_time: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar(
+    "event_time", default=None
+)
+
+
+class _GuildAuditState:
+    __slots__ = ("entries", "index", "seen", "pending", "fetched_at")
+
+    def __init__(self):
+        self.entries: Deque[discord.AuditLogEntry] = collections.deque()
+        self.index: Dict[_Key, discord.AuditLogEntry] = {}
+        self.seen = set()
+        self.pending: Optional[asyncio.Task] = None
+        # Loop time the last finished fetch was sent at.
+        self.fetched_at: Optional[float] = None
+
+    def covers(self, since: Optional[float]) -> bool:
+        if since is None or self.fetched_at is None:
+            return False
+
+        return self.fetched_at >= since
+
+    def add(self, entry: discord.AuditLogEntry):
+        if entry.id in self.seen:
+            return
+
+        self.entries.append(entry)
+        self.seen.add(entry.id)
+        self.index[(entry.action, getattr(entry.target, "id", None))] = entry
+
+        while len(self.entries) > CACHE_SIZE:
+            old = self.entries.popleft()
+            self.seen.discard(old.id)
+
+            key = (old.action, getattr(old.target, "id", None))
+            if self.index.get(key) is old:
+                del self.index[key]
+
+
+class AuditLogService:
+    """A per-guild audit log cache shared by all the logging listeners.
+
+    Requests that arrive within `BATCH_WINDOW` of each other share one fetch
+    of the latest entries, and events are matched to entries by their target
+    instead of by whichever entry happens to be the newest.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._guilds: Dict[int, _GuildAuditState] = {}
+        bot.add_listener(self.on_guild_remove, "on_guild_remove")
+
+    async def fetch(
+        self,
+        guild: discord.Guild,
+        action: discord.AuditLogAction,
+        *,
+        target_id: Optional[int] = None,
+        max_age: float = MAX_AGE,
+    ) -> Optional[discord.AuditLogEntry]:
+        """Returns the entry for `action` on `target_id`, or None.
+
+        If `target_id` is None the newest entry for the action is used.
+        """
+        if not self.bot.permissions.guild(guild).view_audit_log:
+            return None
+
+        state = self._guilds.setdefault(guild.id, _GuildAuditState())
+
+        if (entry := self._lookup(state, action, target_id, max_age)) is not None:
+            return entry
+
+        if state.covers(event_time.get()):
+            return None
+
+        await asyncio.shield(self._batch(guild, state))
+
+        return self._lookup(state, action, target_id, max_age)
+
+    def refresh(self, guild: discord.Guild, since: float) -> Optional[asyncio.Task]:
+        """Returns the batch that will cover events received at `since`.
+
+        None means the cache already covers them, or the audit log can't be
+        read. Lets callers wait for the fetch without awaiting `fetch` itself.
+        """
+        if not self.bot.permissions.guild(guild).view_audit_log:
+            return None
+
+        state = self._guilds.setdefault(guild.id, _GuildAuditState())
+
+        if state.covers(since):
+            return None
+
+        return self._batch(guild, state)
+
+    def _batch(self, guild: discord.Guild, state: _GuildAuditState) -> asyncio.Task:
+        if state.pending is None:
+            state.pending = self.bot.loop.create_task(self._fetch_batch(guild, state))
+
+        return state.pending
+
+    def _lookup(self, state, action, target_id, max_age):
+        if target_id is not None:
+            entry = state.index.get((action, target_id))
+        else:
+            entry = next(
+                (e for e in reversed(state.entries) if e.action is action), None
+            )
+
+        if entry is None:
+            return None
+
+        if discord.utils.utcnow() - entry.created_at > timedelta(seconds=max_age):
+            return None
+
+        return entry
+
+    async def _fetch_batch(self, guild: discord.Guild, state: _GuildAuditState):
+        # Let the rest of the burst pile onto this fetch.
+        await asyncio.sleep(BATCH_WINDOW)
+
+        # Anything arriving from now on may not be in this response, so it
+        # starts a new batch instead of joining this one.
+        state.pending = None
+        started = self.bot.loop.time()
+
+        try:
+            entries = await guild.audit_logs(limit=FETCH_LIMIT).flatten()
+        except discord.HTTPException:
+            return
+        finally:
+            # Even a failed fetch counts, retrying per event would only pile on.
+            state.fetched_at = started
+
+        for entry in reversed(entries):
+            state.add(entry)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._guilds.pop(guild.id, None)
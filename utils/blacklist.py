@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from utils.config import parse_timestamp
+
+
+class BlacklistEntry:
+    __slots__ = ("id", "reason", "expires_at")
+
+    def __init__(self, id: int, reason: str, expires_at: Optional[datetime] = None):
+        self.id = id
+        self.reason = reason
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(
+            record["id"], record["reason"], parse_timestamp(record.get("expires_at"))
+        )
+
+    def to_record(self) -> dict:
+        return {
+            "id": self.id,
+            "reason": self.reason,
+            "expires_at": self.expires_at and self.expires_at.isoformat(),
+        }
+
+    @property
+    def expired(self) -> bool:
+        return (
+            self.expires_at is not None
+            and self.expires_at <= datetime.now(timezone.utc)
+        )
+
+
+class Blacklist:
+    """The in-memory mirror of the `blacklist` table.
+
+    An id can be a user or a guild, snowflakes don't collide. `ids` is a
+    frozenset rebuilt on every change, changes are rare and lookups happen on
+    every message.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, BlacklistEntry] = {}
+        self.ids = frozenset()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self):
+        self.ids = frozenset(self._entries)
+
+    def get(self, id: int) -> Optional[BlacklistEntry]:
+        entry = self._entries.get(id)
+
+        if entry is not None and entry.expired:
+            self.remove(id)
+            return None
+
+        return entry
+
+    def add(self, entry: BlacklistEntry):
+        self._entries[entry.id] = entry
+        self._rebuild()
+
+    def remove(self, id: int):
+        if self._entries.pop(id, None) is not None:
+            self._rebuild()
+
+    def replace(self, entries: Iterable[BlacklistEntry]):
+        self._entries = {entry.id: entry for entry in entries if not entry.expired}
+        self._rebuild()
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def blocks(self, user_id: int, guild_id: Optional[int] = None) -> bool:
+        """Whether a message from this user, in this guild, should be ignored"""
+        ids = self.ids
+
+        # An expired user entry still leaves the guild to check.
+        if user_id in ids and self.get(user_id) is not None:
+            return True
+
+        if guild_id is not None and guild_id in ids:
+            return self.get(guild_id) is not None
+
+        return False
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+COLUMNS = ("guild_id", "case_id", "action", "user_id", "moderator_id", "reason")
+
+# Cases that can be reasoned at once, keeps the UPDATE's array reasonable.
+MAX_REASON_EDIT = 100
+
+
+class CaseManager:
+    """Numbered moderation cases in the `cases` table.
+
+    Numbers are per guild and handed out by bumping the guild's row in
+    `case_counters` with an upsert, so concurrent actions never share a number
+    and a bulk action reserves its whole range with one statement.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def create(
+        self,
+        guild_id: int,
+        action: str,
+        user_id: int,
+        moderator_id: int,
+        reason: Optional[str] = None,
+    ) -> int:
+        cases = await self.create_many(
+            guild_id, action, (user_id,), moderator_id, reason
+        )
+        return cases[0]
+
+    async def create_many(
+        self,
+        guild_id: int,
+        action: str,
+        user_ids: Iterable[int],
+        moderator_id: int,
+        reason: Optional[str] = None,
+    ) -> List[int]:
+        """Records one case per user and returns their numbers"""
+        user_ids = list(user_ids)
+
+        if not user_ids:
+            return []
+
+        async with self.bot.db.acquire() as connection:
+            async with connection.transaction():
+                last = await connection.fetchval(
+                    """
+                    INSERT INTO case_counters(guild_id, last_case) VALUES($1, $2)
+                    ON CONFLICT (guild_id) DO UPDATE
+                    SET last_case = case_counters.last_case + EXCLUDED.last_case
+                    RETURNING last_case
+                    """,
+                    guild_id,
+                    len(user_ids),
+                )
+
+                numbers = list(range(last - len(user_ids) + 1, last + 1))
+
+                await connection.copy_records_to_table(
+                    "cases",
+                    records=[
+                        (guild_id, number, action, user_id, moderator_id, reason)
+                        for number, user_id in zip(numbers, user_ids)
+                    ],
+                    columns=COLUMNS,
+                )
+
+        return numbers
+
+    async def get(self, guild_id: int, case_id: int):
+        return await self.bot.db.fetchrow(
+            "SELECT * FROM cases WHERE guild_id = $1 AND case_id = $2",
+            guild_id,
+            case_id,
+        )
+
+    async def edit_reasons(
+        self, guild_id: int, case_ids: Iterable[int], reason: str
+    ) -> List[int]:
+        """Sets the reason of every given case and returns the ones that exist"""
+        records = await self.bot.db.fetch(
+            """
+            UPDATE cases SET reason = $3, edited_at = $4
+            WHERE guild_id = $1 AND case_id = ANY($2::integer[])
+            RETURNING case_id
+            """,
+            guild_id,
+            list(case_ids),
+            reason,
+            datetime.now(timezone.utc),
+        )
+
+        return sorted(record["case_id"] for record in records)
+
+    async def stats(self, guild_id: int, moderator_id: int):
+        """Per action totals for a moderator, overall and for the last week"""
+        return await self.bot.db.fetch(
+            """
+            SELECT action,
+                   count(*) AS total,
+                   count(*) FILTER (WHERE created_at > now() - interval '7 days')
+                       AS week
+            FROM cases
+            WHERE guild_id = $1 AND moderator_id = $2
+            GROUP BY action
+            ORDER BY total DESC
+            """,
+            guild_id,
+            moderator_id,
+        )
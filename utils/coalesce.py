@@ -0,0 +1,80 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import discord
+
+WINDOW = 2.0
+MAX_DELAY = 10.0
+
+# object id -> (the object before the first update, the object after the last)
+Changes = Dict[int, Tuple[Any, Any]]
+
+
+def diff_attributes(before, after, attributes: Iterable[str]) -> List[str]:
+    """Returns the attributes that differ between two versions of an object"""
+    return [
+        attribute
+        for attribute in attributes
+        if getattr(before, attribute, None) != getattr(after, attribute, None)
+    ]
+
+
+class _Burst:
+    __slots__ = ("guild", "changes", "started", "handle")
+
+    def __init__(self, guild: discord.Guild, started: float):
+        self.guild = guild
+        self.changes: Changes = {}
+        self.started = started
+        self.handle: asyncio.TimerHandle = None
+
+
+class Coalescer:
+    """Merges bursts of update events per guild into one call.
+
+    Reordering channels or roles fires an update for every object that moved.
+    Updates are held until none arrive for `WINDOW` seconds (or `MAX_DELAY`
+    after the first), then `callback` gets the guild and every changed object,
+    with repeated updates to the same object merged into one.
+    """
+
+    def __init__(
+        self,
+        callback: Callable,
+        *,
+        window: float = WINDOW,
+        max_delay: float = MAX_DELAY,
+    ):
+        self.callback = callback
+        self.window = window
+        self.max_delay = max_delay
+        self._bursts: Dict[int, _Burst] = {}
+
+    def put(self, guild: discord.Guild, id: int, before, after):
+        loop = asyncio.get_event_loop()
+
+        if (burst := self._bursts.get(guild.id)) is None:
+            burst = self._bursts[guild.id] = _Burst(guild, loop.time())
+
+        if id in burst.changes:
+            before = burst.changes[id][0]
+
+        burst.changes[id] = (before, after)
+
+        if burst.handle is not None:
+            burst.handle.cancel()
+
+        delay = min(self.window, burst.started + self.max_delay - loop.time())
+        burst.handle = loop.call_later(max(delay, 0), self._flush, guild.id)
+
+    def close(self):
+        for burst in self._bursts.values():
+            burst.handle.cancel()
+
+        self._bursts.clear()
+
+    def _flush(self, guild_id: int):
+        burst = self._bursts.pop(guild_id)
+        asyncio.get_event_loop().create_task(
+            self.callback(burst.guild, burst.changes)
+        )
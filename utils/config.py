@@ -0,0 +1,331 @@
+import asyncio
+import collections
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import asyncpg
+
+from utils.enums import LoggingEnum
+from utils.prefix import PrefixMatcher
+
+
+def parse_options(options: Optional[str]) -> LoggingEnum:
+    """Parses the binary `options` column into a LoggingEnum"""
+    try:
+        return LoggingEnum(int(options, 2))
+    except (ValueError, TypeError):
+        return LoggingEnum.NONE
+
+
+def parse_logoptions(logoptions) -> Dict[str, int]:
+    """Parses the `logoptions` json column, a mapping of category name to channel id"""
+    if isinstance(logoptions, str):
+        try:
+            logoptions = json.loads(logoptions)
+        except ValueError:
+            return {}
+
+    if not isinstance(logoptions, dict):
+        return {}
+
+    return {name.upper(): int(id) for name, id in logoptions.items() if id}
+
+
+def build_routes(
+    options: LoggingEnum, logid: Optional[int], logoptions: Dict[str, int]
+) -> Dict[LoggingEnum, int]:
+    """Maps each enabled logging category to its destination channel"""
+    if LoggingEnum.NONE in options:
+        return {}
+
+    routes = {}
+
+    for category in LoggingEnum:
+        if category is LoggingEnum.NONE or category not in options:
+            continue
+
+        if (channel_id := logoptions.get(category.name, logid)) is not None:
+            routes[category] = channel_id
+
+    return routes
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parses `updated_at`, which is a string when it comes from a snapshot or NOTIFY"""
+    if value is None or isinstance(value, datetime):
+        return value
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class GuildConfig:
+    """A parsed row of the `config` table.
+
+    Built once when a row is loaded so listeners only pay for attribute reads.
+    """
+
+    __slots__ = (
+        "id",
+        "prefix",
+        "logid",
+        "muteid",
+        "options",
+        "logoptions",
+        "updated_at",
+        "matcher",
+        "routes",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        *,
+        prefix: str,
+        logid: Optional[int] = None,
+        muteid: Optional[int] = None,
+        options: LoggingEnum = LoggingEnum.NONE,
+        logoptions: Optional[Dict[str, int]] = None,
+        updated_at: Optional[datetime] = None,
+        case_insensitive: bool = False,
+    ):
+        self.id = id
+        self.prefix = prefix
+        self.logid = logid
+        self.muteid = muteid
+        self.options = options
+        self.logoptions = logoptions or {}
+        self.updated_at = updated_at
+        self.matcher = PrefixMatcher((prefix,), case_insensitive=case_insensitive)
+        self.routes = build_routes(options, logid, self.logoptions)
+
+    @classmethod
+    def from_record(
+        cls,
+        record: asyncpg.Record,
+        *,
+        default_prefix: str,
+        case_insensitive: bool = False,
+    ):
+        return cls(
+            record["id"],
+            prefix=record["prefix"] or default_prefix,
+            logid=record["logid"],
+            muteid=record["muteid"],
+            options=parse_options(record["options"]),
+            logoptions=parse_logoptions(record.get("logoptions")),
+            updated_at=parse_timestamp(record.get("updated_at")),
+            case_insensitive=case_insensitive,
+        )
+
+    def to_record(self) -> dict:
+        """The inverse of `from_record`, used for snapshots"""
+        return {
+            "id": self.id,
+            "prefix": self.prefix,
+            "logid": self.logid,
+            "muteid": self.muteid,
+            "options": bin(self.options),
+            "logoptions": self.logoptions,
+            "updated_at": self.updated_at and self.updated_at.isoformat(),
+        }
+
+    def __repr__(self):
+        return (
+            f"<GuildConfig id={self.id} prefix={self.prefix!r} "
+            f"logid={self.logid} muteid={self.muteid} options={self.options!r}>"
+        )
+
+
+class ConfigStore:
+    """A lazily loaded, LRU bounded cache of guild configs.
+
+    Rows are loaded on first access, concurrent misses for the same guild
+    share a single query, and the least recently used guilds are evicted once
+    ``max_size`` is reached.
+    """
+
+    DEFAULT_MAX_SIZE = 5000
+    PREFETCH_BATCH = 500
+
+    COLUMNS = frozenset(
+        ("prefix", "logid", "joinid", "joinmsg", "logoptions", "options", "muteid")
+    )
+
+    def __init__(self, bot, *, max_size: int = DEFAULT_MAX_SIZE):
+        self.bot = bot
+        self.max_size = max_size
+        self._configs: Dict[int, GuildConfig] = collections.OrderedDict()
+        self._pending: Dict[int, asyncio.Task] = {}
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._configs
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def values(self):
+        return list(self._configs.values())
+
+    @property
+    def default_prefix(self) -> str:
+        return self.bot.config["prefix"]
+
+    @property
+    def case_insensitive(self) -> bool:
+        return self.bot.config.get("case_insensitive_prefix", False)
+
+    def get(self, guild_id: int, default=None) -> Optional[GuildConfig]:
+        """Returns the config if it is already loaded, without querying"""
+        config = self._configs.get(guild_id)
+
+        if config is None:
+            return default
+
+        self._configs.move_to_end(guild_id)
+        return config
+
+    def put(self, config: GuildConfig):
+        self._configs[config.id] = config
+        self._configs.move_to_end(config.id)
+
+        while len(self._configs) > self.max_size:
+            self._configs.popitem(last=False)
+
+    def patch(self, record):
+        """Replaces a config in place if it is loaded or being loaded"""
+        guild_id = record["id"]
+
+        if guild_id in self._configs:
+            self._configs[guild_id] = self.build(record)
+        elif guild_id in self._pending:
+            self.put(self.build(record))
+
+    def invalidate(self, guild_id: int):
+        self._configs.pop(guild_id, None)
+
+    def clear(self):
+        self._configs.clear()
+
+    def build(self, record) -> GuildConfig:
+        return GuildConfig.from_record(
+            record,
+            default_prefix=self.default_prefix,
+            case_insensitive=self.case_insensitive,
+        )
+
+    async def fetch(self, guild_id: int) -> GuildConfig:
+        """Returns the config for a guild, loading it if needed"""
+        if (config := self.get(guild_id)) is not None:
+            return config
+
+        if self.bot.db is None:
+            # Not connected yet, use the defaults without caching them.
+            return GuildConfig(
+                guild_id,
+                prefix=self.default_prefix,
+                case_insensitive=self.case_insensitive,
+            )
+
+        if (task := self._pending.get(guild_id)) is None:
+            task = self.bot.loop.create_task(self._load(guild_id))
+            self._pending[guild_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(guild_id, None))
+
+        return await asyncio.shield(task)
+
+    async def refresh(self, guild_id: int) -> GuildConfig:
+        """Drops the cached config and loads it again"""
+        self.invalidate(guild_id)
+        return await self.fetch(guild_id)
+
+    async def _load(self, guild_id: int) -> GuildConfig:
+        record = await self.bot.db.fetchrow(
+            "SELECT * FROM config WHERE id = $1", guild_id
+        )
+
+        if (config := self._configs.get(guild_id)) is not None:
+            # A notification patched it while we were querying, which is newer.
+            return config
+
+        if record is None:
+            # Cache the miss as well, so unconfigured guilds don't query every event.
+            config = GuildConfig(
+                guild_id,
+                prefix=self.default_prefix,
+                case_insensitive=self.case_insensitive,
+            )
+        else:
+            config = self.build(record)
+
+        self.put(config)
+        return config
+
+    async def update(self, guild_id: int, **fields) -> GuildConfig:
+        """Writes the given columns and swaps in the returned row.
+
+        Several columns can be set at once, it is always a single round trip.
+        """
+        if not fields:
+            raise TypeError("update() requires at least one column.")
+
+        if unknown := fields.keys() - self.COLUMNS:
+            raise TypeError(f"Unknown config columns: {', '.join(unknown)}")
+
+        columns = list(fields)
+        placeholders = ", ".join(f"${i}" for i in range(2, len(columns) + 2))
+        assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+
+        query = f"""
+                INSERT INTO config(id, {', '.join(columns)})
+                VALUES($1, {placeholders})
+                ON CONFLICT (id) DO UPDATE SET {assignments}
+                RETURNING *
+                """
+
+        record = await self.bot.db.fetchrow(query, guild_id, *fields.values())
+
+        config = self.build(record)
+        self.put(config)
+        return config
+
+    async def create(self, guild_id: int) -> GuildConfig:
+        """Makes sure a guild has a config row and caches it"""
+        record = await self.bot.db.fetchrow(
+            """
+            INSERT INTO config(id) VALUES($1)
+            ON CONFLICT (id) DO UPDATE SET id = EXCLUDED.id
+            RETURNING *
+            """,
+            guild_id,
+        )
+
+        config = self.build(record)
+        self.put(config)
+        return config
+
+    async def delete(self, guild_id: int):
+        await self.bot.db.execute("DELETE FROM config WHERE id = $1", guild_id)
+        self.invalidate(guild_id)
+
+    async def prefetch(self, guild_ids: Iterable[int]):
+        """Loads configs in batches, up to the free capacity of the cache"""
+        missing = [id for id in guild_ids if id not in self._configs]
+        missing = missing[: max(self.max_size - len(self._configs), 0)]
+
+        for index in range(0, len(missing), self.PREFETCH_BATCH):
+            batch = missing[index : index + self.PREFETCH_BATCH]
+
+            records = await self.bot.db.fetch(
+                "SELECT * FROM config WHERE id = ANY($1::bigint[])", batch
+            )
+
+            for record in records:
+                if record["id"] not in self._configs:
+                    self.put(self.build(record))
+
+            # Let the gateway breathe between batches.
+            await asyncio.sleep(0)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import discord
+from discord.ext import tasks
+
+from utils.enums import LoggingEnum
+
+FLUSH_INTERVAL = 5
+BATCH_SIZE = 500
+# Past this many buffered rows new events are dropped until Postgres catches up.
+MAX_BUFFER = 50_000
+
+COLUMNS = ("guild_id", "category", "actor_id", "target_id", "payload", "created_at")
+
+# (guild id, category, actor id, target id, embed, created at)
+_Row = Tuple[int, str, Optional[int], Optional[int], discord.Embed, datetime]
+
+
+def _id(obj) -> Optional[int]:
+    return getattr(obj, "id", obj)
+
+
+def month_start(when: datetime) -> datetime:
+    return when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(when: datetime) -> datetime:
+    start = month_start(when)
+    year, month = divmod(start.month, 12)
+    return start.replace(year=start.year + year, month=month + 1)
+
+
+class EventRecorder:
+    """Writes every routed log event to the `log_events` table.
+
+    Events are buffered and written with COPY in batches, so recording costs a
+    fraction of a round trip per event. The payload is the embed that was
+    logged, serialized at flush time so finished paste urls are included.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._buffer: List[_Row] = []
+        self._lock = asyncio.Lock()
+        self._partitions = set()
+        self._logger = logging.getLogger("Events")
+        self.dropped = 0
+
+    def start(self):
+        self.writer.start()
+
+    async def close(self):
+        self.writer.cancel()
+        await self.flush()
+
+    def record(
+        self,
+        guild: discord.Guild,
+        category: LoggingEnum,
+        embed: discord.Embed,
+        *,
+        actor=None,
+        target=None,
+    ):
+        if len(self._buffer) >= MAX_BUFFER:
+            self.dropped += 1
+            return
+
+        self._buffer.append(
+            (
+                guild.id,
+                category.name,
+                _id(actor),
+                _id(target),
+                embed,
+                datetime.now(timezone.utc),
+            )
+        )
+
+        if len(self._buffer) >= BATCH_SIZE and not self._lock.locked():
+            self.bot.loop.create_task(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            while self._buffer:
+                rows = self._buffer[:BATCH_SIZE]
+                del self._buffer[:BATCH_SIZE]
+
+                try:
+                    await self._write(rows)
+                except Exception:
+                    self._logger.exception(f"Failed to write {len(rows)} log events")
+
+                    # Put them back for the next flush, they're retried in order.
+                    self._buffer[:0] = rows
+                    del self._buffer[MAX_BUFFER:]
+                    return
+
+    async def _write(self, rows: List[_Row]):
+        records = [
+            (guild_id, category, actor_id, target_id, json.dumps(embed.to_dict()), at)
+            for guild_id, category, actor_id, target_id, embed, at in rows
+        ]
+
+        async with self.bot.db.acquire() as connection:
+            for month in {month_start(r[-1]) for r in records} - self._partitions:
+                await self._create_partition(connection, month)
+
+            await connection.copy_records_to_table(
+                "log_events", records=records, columns=COLUMNS
+            )
+
+    async def _create_partition(self, connection, month: datetime):
+        end = next_month(month)
+
+        await connection.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS log_events_{month:%Y_%m}
+            PARTITION OF log_events
+            FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')
+            """
+        )
+
+        self._partitions.add(month)
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def writer(self):
+        await self.flush()
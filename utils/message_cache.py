@@ -0,0 +1,199 @@
+import collections
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+CONTENT_LIMIT = 1024
+PER_CHANNEL = 250
+DEFAULT_BUDGET = 8 * 1024 * 1024
+# Rough cost of an entry on top of its content: the object, its slots and the
+# dict / deque slots pointing at it.
+ENTRY_OVERHEAD = 200
+
+
+class CachedMessage:
+    """The parts of a message the logging listeners need.
+
+    Messages from bots are only kept so their deletes can be told apart and
+    skipped, their content is dropped.
+    """
+
+    __slots__ = ("id", "channel_id", "author_id", "content", "attachments", "bot")
+
+    def __init__(
+        self,
+        id: int,
+        channel_id: int,
+        author_id: int,
+        content: str,
+        attachments: int,
+        bot: bool = False,
+    ):
+        self.id = id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.content = "" if bot else content[:CONTENT_LIMIT]
+        self.attachments = attachments
+        self.bot = bot
+
+    @classmethod
+    def from_message(cls, message: discord.Message):
+        return cls(
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.content,
+            len(message.attachments),
+            message.author.bot,
+        )
+
+    @property
+    def size(self) -> int:
+        return ENTRY_OVERHEAD + len(self.content)
+
+
+class MessageCache:
+    """Per-channel ring buffers of compact messages under a global memory budget.
+
+    The raw delete and edit events only carry ids, this is what lets them be
+    logged without keeping discord.py's full Message objects around. When the
+    budget is exceeded the oldest messages across all channels are dropped.
+    """
+
+    def __init__(
+        self, bot, *, budget: int = DEFAULT_BUDGET, per_channel: int = PER_CHANNEL
+    ):
+        self.bot = bot
+        self.budget = budget
+        self.per_channel = per_channel
+        self.size = 0
+        self.count = 0
+        self._channels: Dict[int, Dict[int, CachedMessage]] = {}
+        # Insertion order across every channel, may hold ids that are gone.
+        self._order: Deque[Tuple[int, int]] = collections.deque()
+        bot.add_listener(self.on_message, "on_message")
+        bot.add_listener(self.on_raw_message_edit, "on_raw_message_edit")
+        bot.add_listener(self.on_guild_channel_delete, "on_guild_channel_delete")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, message: CachedMessage):
+        channel = self._channels.setdefault(message.channel_id, {})
+
+        if (old := channel.pop(message.id, None)) is not None:
+            self.size -= old.size
+            self.count -= 1
+
+        channel[message.id] = message
+        self.size += message.size
+        self.count += 1
+        self._order.append((message.channel_id, message.id))
+
+        while len(channel) > self.per_channel:
+            self.size -= channel.pop(next(iter(channel))).size
+            self.count -= 1
+
+        while self.size > self.budget and self._order:
+            channel_id, message_id = self._order.popleft()
+            self.pop(channel_id, message_id)
+
+        # Ids dropped by the channel rings linger in the order, compact it
+        # once they make up most of it.
+        if len(self._order) > 2 * self.count + self.per_channel:
+            self._order = collections.deque(
+                (m.channel_id, m.id)
+                for m in sorted(
+                    (m for c in self._channels.values() for m in c.values()),
+                    key=lambda m: m.id,
+                )
+            )
+
+    def get(self, channel_id: int, message_id: int) -> Optional[CachedMessage]:
+        if (channel := self._channels.get(channel_id)) is None:
+            return None
+
+        return channel.get(message_id)
+
+    def pop(self, channel_id: int, message_id: int) -> Optional[CachedMessage]:
+        if (channel := self._channels.get(channel_id)) is None:
+            return None
+
+        if (message := channel.pop(message_id, None)) is not None:
+            self.size -= message.size
+            self.count -= 1
+
+        if not channel:
+            del self._channels[channel_id]
+
+        return message
+
+    def pop_many(
+        self, channel_id: int, message_ids: Iterable[int]
+    ) -> List[CachedMessage]:
+        messages = (self.pop(channel_id, id) for id in message_ids)
+        return [m for m in messages if m is not None]
+
+    def edit(
+        self, payload: discord.RawMessageUpdateEvent
+    ) -> Tuple[Optional[CachedMessage], Optional[CachedMessage]]:
+        """Applies an edit and returns the message before and after it.
+
+        Edits without new content, like embeds being unfurled, return None
+        for the after message and leave the cache alone.
+        """
+        before = self.get(payload.channel_id, payload.message_id)
+
+        if "content" not in payload.data:
+            return before, None
+
+        author = payload.data.get("author")
+
+        if author is None and before is None:
+            return None, None
+
+        after = CachedMessage(
+            payload.message_id,
+            payload.channel_id,
+            int(author["id"]) if author is not None else before.author_id,
+            payload.data["content"],
+            len(payload.data.get("attachments", ())),
+            author.get("bot", False) if author is not None else before.bot,
+        )
+
+        if before is not None:
+            # Keep its place in the ring, edits aren't new messages.
+            self.size += after.size - before.size
+            self._channels[payload.channel_id][payload.message_id] = after
+        elif payload.guild_id is not None:
+            self.add(after)
+
+        return before, after
+
+    async def on_message(self, message: discord.Message):
+        # The logging listeners ignore DMs, so don't spend memory on them.
+        if message.guild is None:
+            return
+
+        self.add(CachedMessage.from_message(message))
+
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Dispatches `on_message_content_edit(payload, before, after)`.
+
+        Only for edits that changed the content, so pins and embeds being
+        unfurled don't reach the edit log or reinvoke commands.
+        """
+        before, after = self.edit(payload)
+
+        if after is None:
+            return
+
+        if before is not None and before.content == after.content:
+            return
+
+        self.bot.dispatch("message_content_edit", payload, before, after)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if (messages := self._channels.pop(channel.id, None)) is not None:
+            self.size -= sum(m.size for m in messages.values())
+            self.count -= len(messages)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+
+import asyncpg
+
+from utils.blacklist import BlacklistEntry
+
+RECONNECT_DELAY = 5
+HEALTH_CHECK_PERIOD = 15
+
+
+class NotifyListener:
+    """Keeps the in-memory caches in sync through Postgres LISTEN/NOTIFY.
+
+    The `config` and `blacklist` tables have triggers that notify on every
+    change, so writes from other processes are applied here as they happen.
+    """
+
+    CHANNELS = ("config_changed", "blacklist_changed")
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._connection: asyncpg.Connection = None
+        self._task: asyncio.Task = None
+        self._logger = logging.getLogger("Notify")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+
+    async def _run(self):
+        connected_before = False
+
+        while not self.bot.is_closed():
+            try:
+                self._connection = await asyncpg.connect(**self.bot.config["db"])
+
+                for channel in self.CHANNELS:
+                    await self._connection.add_listener(channel, self._dispatch)
+
+                if connected_before:
+                    # Anything could have changed while we weren't listening.
+                    await self._resync()
+
+                connected_before = True
+                self._logger.info("Listening for cache invalidations.")
+
+                while not self._connection.is_closed():
+                    await asyncio.sleep(HEALTH_CHECK_PERIOD)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._logger.exception("Lost the notification connection.")
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _resync(self):
+        self.bot.cache.clear()
+
+        records = await self.bot.db.fetch("SELECT * FROM blacklist")
+
+        self.bot.blacklist.replace(BlacklistEntry.from_record(r) for r in records)
+
+    def _dispatch(self, connection, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return self._logger.warning(f"Malformed payload on {channel}: {payload}")
+
+        if channel == "config_changed":
+            self.on_config_changed(data)
+        elif channel == "blacklist_changed":
+            self.on_blacklist_changed(data)
+
+    def on_config_changed(self, data):
+        if data["op"] == "DELETE":
+            self.bot.cache.invalidate(data["id"])
+        else:
+            self.bot.cache.patch(data["row"])
+
+    def on_blacklist_changed(self, data):
+        if data["op"] == "DELETE":
+            self.bot.blacklist.remove(data["id"])
+        else:
+            self.bot.blacklist.add(BlacklistEntry.from_record(data["row"]))
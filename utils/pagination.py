@@ -0,0 +1,85 @@
+import abc
+from typing import Any, List, Optional
+
+from discord.ext import menus
+
+from utils.help import EMOJIS, PaginatedHelp
+
+# How many pages the double forward button skips when the end isn't known yet.
+SKIP_PAGES = 5
+
+
+class KeysetPageSource(menus.PageSource, abc.ABC):
+    """Pages through a query by the key of the last row seen instead of OFFSET.
+
+    Each page costs one index range scan no matter how deep it is. Pages are
+    fetched as they're reached and kept, so going back doesn't query again.
+    Subclasses implement `fetch`, `key` and `format_page`.
+    """
+
+    def __init__(self, *, per_page: int = 5):
+        self.per_page = per_page
+        self._pages: List[List[Any]] = []
+        self._exhausted = False
+
+    @abc.abstractmethod
+    async def fetch(self, after: Optional[Any], limit: int) -> List[Any]:
+        """Returns up to `limit` entries following the key `after`, or the first ones"""
+
+    @abc.abstractmethod
+    def key(self, entry) -> Any:
+        """Returns the key of an entry, it's passed back to `fetch` as `after`"""
+
+    async def prepare(self):
+        if not self._pages:
+            await self._fetch_next()
+
+    def is_paginating(self) -> bool:
+        return len(self._pages) > 1 or not self._exhausted
+
+    def get_max_pages(self) -> Optional[int]:
+        return len(self._pages) if self._exhausted else None
+
+    @property
+    def loaded_pages(self) -> int:
+        return len(self._pages)
+
+    async def _fetch_next(self):
+        after = self.key(self._pages[-1][-1]) if self._pages else None
+
+        # One extra row tells us whether there's another page without a COUNT.
+        entries = await self.fetch(after, self.per_page + 1)
+
+        if len(entries) <= self.per_page:
+            self._exhausted = True
+
+        if entries[: self.per_page]:
+            self._pages.append(entries[: self.per_page])
+
+    async def get_page(self, page_number: int):
+        while page_number >= len(self._pages) and not self._exhausted:
+            await self._fetch_next()
+
+        if not self._pages:
+            return []
+
+        return self._pages[page_number]
+
+
+class KeysetPages(PaginatedHelp):
+    """PaginatedHelp for a KeysetPageSource, which doesn't know its last page"""
+
+    @menus.button(EMOJIS["double_forward"], position=menus.First(5))
+    async def double_forward(self, payload):
+        page = self.current_page + SKIP_PAGES
+
+        if self.source.get_max_pages() is None:
+            try:
+                await self.source.get_page(page)
+            except IndexError:
+                pass
+
+        if (max_pages := self.source.get_max_pages()) is not None:
+            page = min(page, max(max_pages - 1, 0))
+
+        await self.show_page(page)
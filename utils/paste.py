@@ -0,0 +1,178 @@
+import abc
+import asyncio
+import collections
+import hashlib
+import logging
+import zlib
+from typing import Dict, Optional, Tuple
+
+import discord
+import mystbin
+
+PLACEHOLDER = "Uploading..."
+FAILED = "Upload failed."
+MAX_CONCURRENCY = 4
+CACHE_SIZE = 512
+DEFAULT_MAX_SIZE = 512 * 1024
+TRUNCATED = "\n\n... truncated"
+
+PendingField = Tuple[int, asyncio.Future]
+
+
+def digest(text: str, syntax: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{syntax or ''}\0{text}".encode()).hexdigest()
+
+
+class PasteBackend(abc.ABC):
+    """Somewhere pastes can be stored, `create` returns a url to the paste"""
+
+    @abc.abstractmethod
+    async def create(self, text: str, syntax: Optional[str] = None) -> str:
+        ...
+
+
+class MystbinBackend(PasteBackend):
+    def __init__(self):
+        self.mystbin = mystbin.Client()
+
+    async def create(self, text: str, syntax: Optional[str] = None) -> str:
+        paste = await self.mystbin.post(text, syntax=syntax)
+        return paste.url
+
+
+class LocalBackend(PasteBackend):
+    """Stores compressed pastes in Postgres, keyed on their content.
+
+    They're served by the `cogs.pastes` extension at `{base_url}/paste/{id}`.
+    """
+
+    ID_LENGTH = 32
+
+    def __init__(self, bot, *, base_url: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.bot = bot
+        self.base_url = base_url.rstrip("/")
+        self.max_size = max_size
+
+    async def create(self, text: str, syntax: Optional[str] = None) -> str:
+        if len(text) > self.max_size:
+            text = text[: self.max_size - len(TRUNCATED)] + TRUNCATED
+
+        id = digest(text, syntax)[: self.ID_LENGTH]
+
+        await self.bot.db.execute(
+            """
+            INSERT INTO pastes(id, syntax, content) VALUES($1, $2, $3)
+            ON CONFLICT (id) DO NOTHING
+            """,
+            id,
+            syntax,
+            zlib.compress(text.encode()),
+        )
+
+        return f"{self.base_url}/paste/{id}"
+
+    async def get(self, id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Returns the text and syntax of a paste"""
+        record = await self.bot.db.fetchrow(
+            "SELECT syntax, content FROM pastes WHERE id = $1", id
+        )
+
+        if record is None:
+            return None
+
+        return zlib.decompress(record["content"]).decode(), record["syntax"]
+
+    async def prune(self, days: int) -> str:
+        return await self.bot.db.execute(
+            "DELETE FROM pastes WHERE created_at < now() - make_interval(days => $1)",
+            days,
+        )
+
+
+def get_backend(bot) -> PasteBackend:
+    """Picks the backend from the `paste` section of the config"""
+    config = bot.config.get("paste", {})
+
+    if config.get("backend", "mystbin") == "local":
+        return LocalBackend(
+            bot,
+            base_url=config["base_url"],
+            max_size=config.get("max_size", DEFAULT_MAX_SIZE),
+        )
+
+    return MystbinBackend()
+
+
+class PasteService:
+    """Uploads pastes in the background with bounded concurrency.
+
+    Uploads are keyed on a hash of their content, identical text is only
+    uploaded once and later requests get the cached url.
+    """
+
+    def __init__(self, bot, backend: PasteBackend):
+        self.bot = bot
+        self.backend = backend
+        self._urls: Dict[str, str] = collections.OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self._logger = logging.getLogger("Pastes")
+
+    def submit(self, text: str, syntax: Optional[str] = None) -> asyncio.Future:
+        """Queues an upload and returns a future for its url"""
+        key = digest(text, syntax)
+
+        if (url := self._urls.get(key)) is not None:
+            self._urls.move_to_end(key)
+
+            future = self.bot.loop.create_future()
+            future.set_result(url)
+            return future
+
+        if (task := self._pending.get(key)) is None:
+            task = self.bot.loop.create_task(self._upload(key, text, syntax))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        return task
+
+    async def paste(self, text: str, syntax: Optional[str] = None) -> str:
+        return await asyncio.shield(self.submit(text, syntax))
+
+    def add_field(
+        self,
+        embed: discord.Embed,
+        *,
+        name: str,
+        text: str,
+        syntax: Optional[str] = None,
+        inline: bool = True,
+    ) -> PendingField:
+        """Adds a placeholder field that is filled in once the upload finishes"""
+        embed.add_field(name=name, value=PLACEHOLDER, inline=inline)
+        return len(embed.fields) - 1, self.submit(text, syntax)
+
+    async def _upload(self, key: str, text: str, syntax: Optional[str]) -> str:
+        async with self._semaphore:
+            url = await self.backend.create(text, syntax)
+
+        self._urls[key] = url
+
+        while len(self._urls) > CACHE_SIZE:
+            self._urls.popitem(last=False)
+
+        return url
+
+
+def resolve_field(embed: discord.Embed, pending: PendingField) -> bool:
+    """Fills in a placeholder field if its upload is done"""
+    index, future = pending
+
+    if not future.done():
+        return False
+
+    field = embed.fields[index]
+    value = FAILED if future.cancelled() or future.exception() else future.result()
+
+    embed.set_field_at(index, name=field.name, value=value, inline=field.inline)
+    return True
@@ -0,0 +1,75 @@
+from typing import Dict
+
+import discord
+
+
+class PermissionCache:
+    """The bot's resolved permissions per guild and per channel.
+
+    Resolving them walks every role (and overwrite) the bot has, so they're
+    kept until something that could change them happens: a role update, an
+    update to the bot's own member or a channel's overwrites changing.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._guilds: Dict[int, discord.Permissions] = {}
+        self._channels: Dict[int, discord.Permissions] = {}
+        # guild id -> ids of the channels cached for it
+        self._guild_channels: Dict[int, set] = {}
+
+        bot.add_listener(self.on_guild_role_delete, "on_guild_role_delete")
+        bot.add_listener(self.on_guild_role_update, "on_guild_role_update")
+        bot.add_listener(self.on_member_update, "on_member_update")
+        bot.add_listener(self.on_guild_channel_update, "on_guild_channel_update")
+        bot.add_listener(self.on_guild_channel_delete, "on_guild_channel_delete")
+        bot.add_listener(self.on_guild_remove, "on_guild_remove")
+
+    def guild(self, guild: discord.Guild) -> discord.Permissions:
+        if (permissions := self._guilds.get(guild.id)) is None:
+            permissions = self._guilds[guild.id] = guild.me.guild_permissions
+
+        return permissions
+
+    def channel(self, channel: discord.abc.GuildChannel) -> discord.Permissions:
+        if (permissions := self._channels.get(channel.id)) is None:
+            permissions = channel.permissions_for(channel.guild.me)
+
+            self._channels[channel.id] = permissions
+            self._guild_channels.setdefault(channel.guild.id, set()).add(channel.id)
+
+        return permissions
+
+    def invalidate(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+        for channel_id in self._guild_channels.pop(guild_id, ()):
+            self._channels.pop(channel_id, None)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        # The role is already gone from the bot's roles, so it can't be checked.
+        self.invalidate(role.guild.id)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.permissions == after.permissions:
+            return
+
+        if after.is_default() or after in after.guild.me.roles:
+            self.invalidate(after.guild.id)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.id == self.bot.user.id:
+            self.invalidate(after.guild.id)
+
+    async def on_guild_channel_update(self, before, after):
+        if before.overwrites != after.overwrites:
+            self._channels.pop(after.id, None)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self._channels.pop(channel.id, None)
+
+        if (channels := self._guild_channels.get(channel.guild.id)) is not None:
+            channels.discard(channel.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.invalidate(guild.id)
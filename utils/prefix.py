@@ -0,0 +1,52 @@
+from typing import Iterable, Optional
+
+
+class PrefixMatcher:
+    """A precompiled set of prefixes.
+
+    Messages whose first character can't start any prefix are rejected with a
+    single set lookup, which is the common case for ordinary chatter.
+    """
+
+    __slots__ = ("prefixes", "case_insensitive", "_initials")
+
+    def __init__(self, prefixes: Iterable[str], *, case_insensitive: bool = False):
+        prefixes = {prefix for prefix in prefixes if prefix}
+
+        if case_insensitive:
+            prefixes = {prefix.lower() for prefix in prefixes}
+
+        # Longest first so `h!!` wins over `h!`.
+        self.prefixes = tuple(sorted(prefixes, key=len, reverse=True))
+        self.case_insensitive = case_insensitive
+        self._initials = frozenset(prefix[0] for prefix in self.prefixes)
+
+    def match(self, content: str) -> Optional[str]:
+        """Returns the prefix as written in `content`, or None"""
+        if not content:
+            return None
+
+        if self.case_insensitive:
+            if content[0].lower() not in self._initials:
+                return None
+
+            for prefix in self.prefixes:
+                if content[: len(prefix)].lower() == prefix:
+                    return content[: len(prefix)]
+
+            return None
+
+        if content[0] not in self._initials:
+            return None
+
+        for prefix in self.prefixes:
+            if content.startswith(prefix):
+                return prefix
+
+        return None
+
+    def __repr__(self):
+        return (
+            f"<PrefixMatcher prefixes={self.prefixes!r} "
+            f"case_insensitive={self.case_insensitive}>"
+        )
@@ -0,0 +1,92 @@
+from typing import Dict, Optional, Sequence
+
+import discord
+
+from utils.enums import LoggingEnum
+from utils.paste import PendingField
+from utils.sink import LogSink, WebhookPool, WebhookSink
+
+
+class LogRouter:
+    """Decides where, if anywhere, a logging event goes.
+
+    The routing table lives on each GuildConfig and is only rebuilt when the
+    config changes, so unsubscribed guilds are dropped with one lookup.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._sinks: Dict[int, LogSink] = {}
+        self.webhooks = (
+            WebhookPool(bot) if bot.config.get("log_delivery") == "webhook" else None
+        )
+        bot.add_listener(self.on_guild_channel_delete, "on_guild_channel_delete")
+
+    async def route(
+        self, guild: discord.Guild, category: LoggingEnum
+    ) -> Optional[discord.TextChannel]:
+        """Returns the channel to log `category` to, or None"""
+        config = await self.bot.cache.fetch(guild.id)
+
+        if (channel_id := config.routes.get(category)) is None:
+            return None
+
+        if not self.bot.permissions.guild(guild).view_audit_log:
+            return None
+
+        if (channel := guild.get_channel(channel_id)) is None:
+            return None
+
+        # Don't queue embeds that can only fail with Forbidden.
+        permissions = self.bot.permissions.channel(channel)
+
+        if not (permissions.send_messages and permissions.embed_links):
+            return None
+
+        return channel
+
+    async def send(
+        self,
+        channel: discord.TextChannel,
+        embed: discord.Embed,
+        *,
+        pending: Sequence[PendingField] = (),
+        file: Optional[discord.File] = None,
+        category: Optional[LoggingEnum] = None,
+        actor=None,
+        target=None,
+    ):
+        """Queues the embed on the channel's sink, this doesn't wait for delivery.
+
+        With a `category` the event is also recorded to `log_events`, `actor`
+        and `target` are the users or objects involved, or their ids.
+        """
+        if category is not None:
+            self.bot.events.record(
+                channel.guild, category, embed, actor=actor, target=target
+            )
+
+        if (sink := self._sinks.get(channel.id)) is None:
+            sink = self._sinks[channel.id] = (
+                WebhookSink(channel, self.webhooks)
+                if self.webhooks is not None
+                else LogSink(channel)
+            )
+
+        sink.put(embed, pending, file)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if (sink := self._sinks.pop(channel.id, None)) is not None:
+            sink.close()
+
+        if self.webhooks is not None:
+            self.webhooks.invalidate(channel.id)
+
+        config = self.bot.cache.get(channel.guild.id)
+
+        if config is None:
+            return
+
+        for category, channel_id in list(config.routes.items()):
+            if channel_id == channel.id:
+                del config.routes[category]
@@ -0,0 +1,247 @@
+import asyncio
+import collections
+import functools
+import logging
+from datetime import datetime
+from typing import Callable, Counter, Deque, Dict, Optional, Tuple
+
+import discord
+
+from utils.audit import event_time
+from utils.BaseEmbed import CustomEmbed
+from utils.enums import LoggingEnum
+
+MAX_QUEUE = 50
+# A summarizing guild goes back to individual logs once it drains to this.
+RESUME_AT = 10
+WORKERS = 4
+
+# (category, what happened, audit log action to attribute it with)
+_Summary = Tuple[LoggingEnum, str, Optional[discord.AuditLogAction]]
+
+
+class _Job:
+    __slots__ = ("func", "audit", "received")
+
+    def __init__(self, func: Callable, *, audit: bool, received: float):
+        self.func = func
+        # Whether it reads the audit log, those wait for it off the workers.
+        self.audit = audit
+        self.received = received
+
+
+class _GuildQueue:
+    __slots__ = ("guild", "jobs", "summaries", "summarizing", "scheduled", "parked")
+
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self.jobs: Deque[_Job] = collections.deque()
+        self.summaries: Counter[_Summary] = collections.Counter()
+        self.summarizing = False
+        self.scheduled = False
+        self.parked = False
+
+
+class LogScheduler:
+    """Runs logging work through bounded per-guild queues.
+
+    Workers take guilds round robin and run one job each turn, so a raid in
+    one guild can't starve the others. When a guild's queue is full it stops
+    queueing and counts events instead, then sends a summary like
+    "37 channels deleted" once it has caught up.
+
+    A job that needs the audit log doesn't hold a worker while the entries are
+    fetched, its guild is parked until the batch lands and the worker moves on.
+    Every job received before that fetch then runs without waiting again.
+    """
+
+    def __init__(self, bot, *, max_queue: int = MAX_QUEUE, workers: int = WORKERS):
+        self.bot = bot
+        self.max_queue = max_queue
+        self.workers = workers
+        self._guilds: Dict[int, _GuildQueue] = {}
+        self._ready: "asyncio.Queue[int]" = asyncio.Queue()
+        self._tasks = []
+        self._logger = logging.getLogger("Log Scheduler")
+
+        self.processed = 0
+        self.shed = 0
+        self.summaries = 0
+
+    def submit(
+        self,
+        guild: discord.Guild,
+        job: Callable,
+        *,
+        category: LoggingEnum,
+        summary: str,
+        action: Optional[discord.AuditLogAction] = None,
+    ):
+        """Queues `job`, a coroutine function, or counts it towards a summary"""
+        if (state := self._guilds.get(guild.id)) is None:
+            state = self._guilds[guild.id] = _GuildQueue(guild)
+
+        if state.summarizing or len(state.jobs) >= self.max_queue:
+            state.summarizing = True
+            state.summaries[(category, summary, action)] += 1
+            self.shed += 1
+        else:
+            state.jobs.append(
+                _Job(job, audit=action is not None, received=self.bot.loop.time())
+            )
+
+        if not state.scheduled:
+            state.scheduled = True
+            self._ready.put_nowait(guild.id)
+
+        if not self._tasks:
+            self._tasks = [
+                self.bot.loop.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def stats(self) -> dict:
+        depths = {id: len(state.jobs) for id, state in self._guilds.items()}
+
+        return {
+            "queued": sum(depths.values()),
+            "guilds": len(depths),
+            "summarizing": sum(s.summarizing for s in self._guilds.values()),
+            "parked": sum(s.parked for s in self._guilds.values()),
+            "processed": self.processed,
+            "shed": self.shed,
+            "summaries": self.summaries,
+            "deepest": sorted(depths.items(), key=lambda i: i[1], reverse=True)[:5],
+        }
+
+    async def _worker(self):
+        while True:
+            guild_id = await self._ready.get()
+            state = self._guilds[guild_id]
+
+            if self.bot.get_guild(guild_id) is None:
+                # The bot left, nothing queued for it can be sent anymore.
+                del self._guilds[guild_id]
+                continue
+
+            try:
+                if state.summarizing and len(state.jobs) <= RESUME_AT:
+                    # The summarized events came after everything still queued,
+                    # so the summary goes last.
+                    summaries, state.summaries = state.summaries, collections.Counter()
+                    state.summarizing = False
+                    state.jobs.append(
+                        _Job(
+                            functools.partial(self._summarize, state.guild, summaries),
+                            audit=any(action for _, _, action in summaries),
+                            received=self.bot.loop.time(),
+                        )
+                    )
+
+                if state.jobs:
+                    # Taken off first so a failing refresh drops the job rather
+                    # than retrying it forever.
+                    job = state.jobs.popleft()
+
+                    if job.audit:
+                        batch = self.bot.audit.refresh(state.guild, job.received)
+
+                        if batch is not None:
+                            state.jobs.appendleft(job)
+                            state.parked = True
+                            batch.add_done_callback(
+                                lambda _, id=guild_id: self._unpark(id)
+                            )
+                            continue
+
+                    token = event_time.set(job.received)
+
+                    try:
+                        await job.func()
+                    finally:
+                        event_time.reset(token)
+
+                    self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._logger.exception(f"Logging job for {guild_id} failed")
+
+            if state.jobs or state.summaries:
+                self._ready.put_nowait(guild_id)
+            else:
+                del self._guilds[guild_id]
+
+    def _unpark(self, guild_id: int):
+        if (state := self._guilds.get(guild_id)) is not None and state.parked:
+            state.parked = False
+            self._ready.put_nowait(guild_id)
+
+    async def _summarize(self, guild: discord.Guild, summaries: Counter[_Summary]):
+        lines: Dict[LoggingEnum, list] = collections.defaultdict(list)
+
+        for (category, summary, action), count in summaries.items():
+            line = f"{count} {summary}"
+
+            if action is not None:
+                entry = await self.bot.audit.fetch(guild, action, max_age=300)
+
+                if entry is not None:
+                    line += f", latest by {entry.user} [{entry.user.id}]"
+
+            lines[category].append(line)
+
+        for category, category_lines in lines.items():
+            if (channel := await self.bot.router.route(guild, category)) is None:
+                continue
+
+            embed = CustomEmbed(
+                title="Log Summary",
+                description=(
+                    "Too much happened at once to log everything separately.\n\n"
+                    + "\n".join(category_lines)
+                ),
+                timestamp=datetime.utcnow(),
+            )
+
+            await self.bot.router.send(channel, embed, category=category)
+            self.summaries += 1
+
+
+def scheduled(
+    category: LoggingEnum,
+    summary: str,
+    *,
+    action: Optional[discord.AuditLogAction] = None,
+    guild: Callable[..., Optional[discord.Guild]] = lambda bot, obj, *_: obj.guild,
+):
+    """Runs a logging cog method through the bot's LogScheduler.
+
+    `guild` gets the bot and the method's arguments and returns the guild the
+    event belongs to. Events for guilds that don't log `category` are dropped
+    before they're queued.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args):
+            if (target := guild(self.bot, *args)) is None:
+                return
+
+            if await self.bot.router.route(target, category) is None:
+                return
+
+            self.bot.log_scheduler.submit(
+                target,
+                functools.partial(func, self, *args),
+                category=category,
+                summary=summary,
+                action=action,
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,213 @@
+import asyncio
+import collections
+import logging
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import discord
+
+from utils.paste import PendingField, resolve_field
+
+FLUSH_DELAY = 2.0
+MAX_EMBEDS = 10
+MAX_CHARACTERS = 6000
+# Room for a paste url to replace its placeholder after the message is sent.
+PENDING_FIELD_SIZE = 100
+
+_Item = Tuple[discord.Embed, Sequence[PendingField], Optional[discord.File]]
+
+
+class LogSink:
+    """Buffers the embeds for one log channel and sends up to ten per message.
+
+    A message with ten embeds costs one rate limit slot instead of ten. The
+    buffer is flushed when it is full or `FLUSH_DELAY` after the first embed,
+    in the order the embeds were put.
+
+    Embeds can carry pending paste fields, the message is edited once those
+    uploads finish so delivery never waits on the paste host. They can also
+    carry a file, a batch holds at most one so uploads stay under the size limit.
+    """
+
+    def __init__(self, channel: discord.TextChannel):
+        self.channel = channel
+        self._queue: Deque[_Item] = collections.deque()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task = None
+        self._logger = logging.getLogger("Log Sink")
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(
+        self,
+        embed: discord.Embed,
+        pending: Sequence[PendingField] = (),
+        file: Optional[discord.File] = None,
+    ):
+        self._queue.append((embed, pending, file))
+
+        if len(self._queue) >= MAX_EMBEDS:
+            self._full.set()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        for _, _, file in self._queue:
+            if file is not None:
+                file.close()
+
+        self._queue.clear()
+
+    def _take_batch(self) -> List[_Item]:
+        batch = []
+        characters = 0
+        has_file = False
+
+        while self._queue and len(batch) < MAX_EMBEDS:
+            embed, pending, file = self._queue[0]
+            size = len(embed) + PENDING_FIELD_SIZE * len(pending)
+
+            # Discord caps the combined size of all embeds in one message.
+            if batch and characters + size > MAX_CHARACTERS:
+                break
+
+            if file is not None and has_file:
+                break
+
+            batch.append(self._queue.popleft())
+            characters += size
+            has_file = has_file or file is not None
+
+        return batch
+
+    async def _run(self):
+        while self._queue:
+            if len(self._queue) < MAX_EMBEDS:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=FLUSH_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._full.clear()
+
+            batch = self._take_batch()
+            embeds = [embed for embed, _, _ in batch]
+            files = [file for _, _, file in batch if file is not None]
+
+            # Uploads that already finished (or were cached) go out with the message.
+            pending = [
+                (embed, field)
+                for embed, fields, _ in batch
+                for field in fields
+                if not resolve_field(embed, field)
+            ]
+
+            try:
+                message = await self.deliver(embeds, files)
+            except discord.Forbidden:
+                continue
+            except discord.HTTPException:
+                self._logger.exception(f"Failed to deliver logs to {self.channel.id}")
+                continue
+
+            if pending and message is not None:
+                asyncio.get_event_loop().create_task(
+                    self._fill_pending(message, embeds, pending)
+                )
+
+    async def _fill_pending(self, message, embeds, pending):
+        await asyncio.gather(
+            *(future for _, (_, future) in pending), return_exceptions=True
+        )
+
+        for embed, field in pending:
+            resolve_field(embed, field)
+
+        try:
+            await message.edit(embeds=embeds)
+        except discord.HTTPException:
+            pass
+
+    async def deliver(
+        self, embeds: List[discord.Embed], files: List[discord.File] = ()
+    ) -> Optional[discord.Message]:
+        return await self.channel.send(embeds=embeds, files=files or None)
+
+
+class WebhookPool:
+    """One managed webhook per log channel, bound to the bot's aiohttp session.
+
+    Webhooks have their own rate limits, so log traffic doesn't compete with
+    command replies for the bot's buckets.
+    """
+
+    HOOK_NAME = "Harley Logs"
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._hooks: Dict[int, discord.Webhook] = {}
+
+    def invalidate(self, channel_id: int):
+        self._hooks.pop(channel_id, None)
+
+    async def get(self, channel: discord.TextChannel) -> Optional[discord.Webhook]:
+        """Returns the channel's webhook, creating it if needed"""
+        if (hook := self._hooks.get(channel.id)) is not None:
+            return hook
+
+        if not self.bot.permissions.channel(channel).manage_webhooks:
+            return None
+
+        hook = discord.utils.find(
+            lambda h: h.user == self.bot.user and h.name == self.HOOK_NAME and h.token,
+            await channel.webhooks(),
+        )
+
+        if hook is None:
+            hook = await channel.create_webhook(
+                name=self.HOOK_NAME, reason="Used to deliver logs."
+            )
+
+        hook = discord.Webhook.from_url(hook.url, session=self.bot.session)
+        self._hooks[channel.id] = hook
+        return hook
+
+
+class WebhookSink(LogSink):
+    """A LogSink that delivers through the channel's managed webhook"""
+
+    def __init__(self, channel: discord.TextChannel, pool: WebhookPool):
+        super().__init__(channel)
+        self.pool = pool
+
+    async def deliver(
+        self, embeds: List[discord.Embed], files: List[discord.File] = ()
+    ):
+        me = self.channel.guild.me
+
+        for _ in range(2):
+            if (hook := await self.pool.get(self.channel)) is None:
+                # No manage webhooks permission, fall back to sending as the bot.
+                return await super().deliver(embeds, files)
+
+            for file in files:
+                # A failed attempt may have read the file already.
+                file.reset()
+
+            try:
+                return await hook.send(
+                    embeds=embeds,
+                    files=files or discord.utils.MISSING,
+                    username=me.display_name,
+                    avatar_url=me.display_avatar.url,
+                    wait=True,
+                )
+            except discord.NotFound:
+                # Someone deleted the webhook, make a new one and retry once.
+                self.pool.invalidate(self.channel.id)
+
+        return await super().deliver(embeds, files)
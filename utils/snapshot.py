@@ -0,0 +1,119 @@
+import gzip
+import json
+import logging
+import os
+
+from discord.ext import tasks
+
+from utils.blacklist import BlacklistEntry
+
+DEFAULT_PATH = "cache_snapshot.json.gz"
+DEFAULT_INTERVAL = 300
+VERSION = 2
+
+
+class CacheSnapshot:
+    """Periodically saves the config and blacklist caches to a local file.
+
+    On boot the file is loaded straight into the caches so prefixes resolve
+    before Postgres answers, then `reconcile` re-reads only the rows whose
+    `updated_at` no longer matches.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.path = bot.config.get("snapshot_path", DEFAULT_PATH)
+        self._logger = logging.getLogger("Snapshot")
+
+        self.writer.change_interval(
+            seconds=bot.config.get("snapshot_interval", DEFAULT_INTERVAL)
+        )
+
+    def load(self) -> bool:
+        """Fills the caches from the snapshot file, if there is a usable one"""
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            self._logger.exception("Ignoring unreadable snapshot.")
+            return False
+
+        if data.get("version") != VERSION:
+            return False
+
+        for record in data["configs"]:
+            self.bot.cache.put(self.bot.cache.build(record))
+
+        self.bot.blacklist.replace(
+            BlacklistEntry.from_record(record) for record in data["blacklist"]
+        )
+
+        self._logger.info(
+            f"Loaded {len(data['configs'])} configs and "
+            f"{len(data['blacklist'])} blacklist entries from the snapshot."
+        )
+        return True
+
+    def _serialize(self) -> bytes:
+        data = {
+            "version": VERSION,
+            "configs": [config.to_record() for config in self.bot.cache.values()],
+            "blacklist": [entry.to_record() for entry in self.bot.blacklist.entries()],
+        }
+
+        return gzip.compress(json.dumps(data, separators=(",", ":")).encode())
+
+    def _write(self, payload: bytes):
+        temp = f"{self.path}.tmp"
+
+        with open(temp, "wb") as fp:
+            fp.write(payload)
+
+        # Atomic, a crash mid-write never leaves a truncated snapshot behind.
+        os.replace(temp, self.path)
+
+    async def dump(self):
+        payload = self._serialize()
+        await self.bot.loop.run_in_executor(None, self._write, payload)
+
+    async def reconcile(self):
+        """Re-reads snapshot rows that changed or were deleted while we were down"""
+        configs = self.bot.cache.values()
+
+        if not configs:
+            return
+
+        query = """
+                SELECT s.id AS snapshot_id, c.*
+                FROM unnest($1::bigint[], $2::timestamptz[]) AS s(id, updated_at)
+                LEFT JOIN config c ON c.id = s.id
+                WHERE c.id IS NULL OR c.updated_at IS DISTINCT FROM s.updated_at
+                """
+
+        records = await self.bot.db.fetch(
+            query,
+            [config.id for config in configs],
+            [config.updated_at for config in configs],
+        )
+
+        for record in records:
+            if record["id"] is None:
+                self.bot.cache.invalidate(record["snapshot_id"])
+            else:
+                self.bot.cache.put(self.bot.cache.build(record))
+
+        blacklisted = await self.bot.db.fetch("SELECT * FROM blacklist")
+
+        self.bot.blacklist.replace(BlacklistEntry.from_record(r) for r in blacklisted)
+
+        self._logger.info(f"Reconciled snapshot, {len(records)} configs were stale.")
+
+    @tasks.loop(seconds=DEFAULT_INTERVAL)
+    async def writer(self):
+        try:
+            await self.dump()
+        except Exception:
+            # Don't let a full disk stop the loop for good.
+            self._logger.exception("Failed to write the snapshot.")
@@ -7,7 +7,7 @@ import sys
 import traceback
 from datetime import datetime
 from random import choice
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
 import asyncdagpi
@@ -17,32 +17,40 @@ from discord import Message
 from discord.enums import ActivityType
 from discord.ext import commands, ipc
 
+from utils.audit import AuditLogService
+from utils.blacklist import Blacklist, BlacklistEntry
+from utils.cases import CaseManager
+from utils.config import ConfigStore, GuildConfig
+from utils.CustomErrors import DatabaseUnavailable
+from utils.events import EventRecorder
+from utils.message_cache import DEFAULT_BUDGET, PER_CHANNEL, MessageCache
+from utils.notify import NotifyListener
+from utils.paste import PasteService, get_backend
+from utils.permissions import PermissionCache
+from utils.prefix import PrefixMatcher
+from utils.router import LogRouter
+from utils.scheduler import MAX_QUEUE, WORKERS, LogScheduler
+from utils.snapshot import CacheSnapshot
+from utils.timers import TimerManager
+
 os.environ["JISHAKU_NO_UNDERSCORE"] = "True"
 os.environ["JISHAKU_NO_DM_TRACEBACK"] = "True"
 os.environ["JISHAKU_HIDE"] = "True"
 
 
-async def get_prefix(bot, message: discord.Message) -> str:
-
-    if message.guild is None:
-        return "h,"
-
-    cache = bot.cache.get(message.guild.id)
-
-    if cache is None:
-        cache = bot.cache.get("default")
-
-    prefix = cache.get("prefix", bot.config["prefix"])
+async def get_prefix(bot, message: discord.Message) -> List[str]:
+    prefix = await bot.match_prefix(message)
 
-    if prefix is None:
-        prefix = bot.config["prefix"]
-
-    return commands.when_mentioned_or(prefix)(bot, message)
+    return [prefix] if prefix is not None else []
 
 
 intent = discord.Intents.default()
 intent.members = True
 
+# Message logging, edit reinvokes and reply cleanup run off `bot.messages` and
+# the raw events, nothing relies on discord.py's own cache.
+MAX_MESSAGES = 100
+
 
 class HarleyBot(commands.AutoShardedBot):
     def __init__(self, **options):
@@ -51,6 +59,7 @@ class HarleyBot(commands.AutoShardedBot):
             intents=intent,
             allowed_mentions=discord.AllowedMentions.none(),
             activity=discord.Activity(type=ActivityType.listening, name="@Harley"),
+            max_messages=MAX_MESSAGES,
             **options,
         )
 
@@ -58,10 +67,10 @@ class HarleyBot(commands.AutoShardedBot):
 
         self._BotBase__cogs = commands.core._CaseInsensitiveDict()
         self.usage = 0
-        self.cache = {}
-        self.blacklisted = {}
+        self.blacklist = Blacklist()
         self.start_time = datetime.utcnow()
-        self.edit_mapping: Dict[Message, Message] = CappedDict(max_size=100)
+        # Invoking message id -> the bot's reply, so edits reuse the reply.
+        self.edit_mapping: Dict[int, Message] = CappedDict(max_size=100)
 
         self.config = json.load(open("config.json"))
         self.custom_emojis = json.load(open("emojis.json"))
@@ -71,41 +80,139 @@ class HarleyBot(commands.AutoShardedBot):
         self.ipc = ipc.Server(self, self.config.get("ipc_key"))
         self.load_extension("cogs.ipc")
 
-        self.db = self.loop.run_until_complete(asyncpg.create_pool(**self.config["db"]))
+        self.cache = ConfigStore(
+            self, max_size=self.config.get("config_cache_size", 5000)
+        )
+        self.default_config = GuildConfig(0, prefix=self.config["prefix"])
+        self.dm_matcher = PrefixMatcher(("h,",))
+        self._mentions: Tuple[str, ...] = ()
+        self.notifier = NotifyListener(self)
+        self.snapshot = CacheSnapshot(self)
 
-        self._dagpi = asyncdagpi.Client(self.config["dagpi"])
+        # Serve prefixes from the last run while Postgres catches up.
+        self.warm_start = self.snapshot.load()
+
+        # Set once the pool is up, a slow or down Postgres doesn't hold up login.
+        self.db: Optional[asyncpg.Pool] = None
+        self.db_ready = asyncio.Event()
 
-        self.cache.update({"default": {"prefix": self.config["prefix"]}})
+        self._dagpi = asyncdagpi.Client(self.config["dagpi"])
 
         self.load_extension("utils.utils")
 
-        self.loop.run_until_complete(self._ainit())
+        self.messages = MessageCache(
+            self,
+            budget=self.config.get("message_cache_budget", DEFAULT_BUDGET),
+            per_channel=self.config.get("message_cache_per_channel", PER_CHANNEL),
+        )
+        self.permissions = PermissionCache(self)
+        self.events = EventRecorder(self)
+        self.router = LogRouter(self)
+        self.audit = AuditLogService(self)
+        self.log_scheduler = LogScheduler(
+            self,
+            max_queue=self.config.get("log_queue_size", MAX_QUEUE),
+            workers=self.config.get("log_workers", WORKERS),
+        )
+        self.pastes = PasteService(self, get_backend(self))
+        self.timers = TimerManager(self)
+        self.cases = CaseManager(self)
+
+        self.loop.create_task(self._ainit())
 
         self.load_cogs()
 
     async def get_context(self, message, *, cls=None):
-        return await super().get_context(message, cls=cls or HarleyContext)
+        ctx = await super().get_context(message, cls=cls or HarleyContext)
+
+        if isinstance(ctx, HarleyContext) and ctx.guild is not None:
+            # Held by the context so an eviction mid command can't lose it.
+            ctx._config = await self.cache.fetch(ctx.guild.id)
+
+        return ctx
+
+    async def match_prefix(self, message: discord.Message) -> Optional[str]:
+        """Returns the prefix the message was invoked with, or None"""
+        content = message.content
+
+        if not content:
+            return None
+
+        if content[0] == "<" and self.user is not None:
+            if not self._mentions:
+                self._mentions = (f"<@{self.user.id}> ", f"<@!{self.user.id}> ")
+
+            for mention in self._mentions:
+                if content.startswith(mention):
+                    return mention
+
+        if message.guild is None:
+            return self.dm_matcher.match(content)
+
+        config = await self.cache.fetch(message.guild.id)
+        return config.matcher.match(content)
+
+    async def process_commands(self, message: discord.Message):
+        if message.author.bot:
+            return
+
+        # Without a snapshot there's no blacklist to check until Postgres is up.
+        if not self.warm_start and not self.db_ready.is_set():
+            return
+
+        if self.blacklist.blocks(message.author.id, getattr(message.guild, "id", None)):
+            return
+
+        # Most messages aren't commands, reject them before building a Context.
+        if await self.match_prefix(message) is None:
+            return
+
+        ctx = await self.get_context(message)
+        await self.invoke(ctx)
+
+    async def _connect(self) -> asyncpg.Pool:
+        delay = 1
+
+        while True:
+            try:
+                return await asyncpg.create_pool(**self.config["db"])
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+                self._logger.exception(
+                    f"Couldn't connect to Postgres, retrying in {delay}s."
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
 
     async def _ainit(self):
         """Async init"""
-        configs = await self.db.fetch("SELECT * FROM config")
+        self._hook = await self.utils.get_hook()
 
-        for config in configs:
-            self.cache.update({config["id"]: dict(config)})
+        self.db = await self._connect()
+        self.db_ready.set()
 
-        blacklisted = await self.db.fetch("SELECT * FROM blacklist")
+        if self.warm_start:
+            self.loop.create_task(self.snapshot.reconcile())
+        else:
+            blacklisted = await self.db.fetch("SELECT * FROM blacklist")
 
-        self._hook = await self.utils.get_hook()
+            self.blacklist.replace(BlacklistEntry.from_record(r) for r in blacklisted)
 
-        for user in blacklisted:
-            self.blacklisted.update({user["id"]: user["reason"]})
+        self.notifier.start()
+        self.snapshot.writer.start()
+        self.events.start()
+        self.timers.start()
 
     def template(self, record: asyncpg.Record):
         return {record["id"]: dict(record)}
 
     async def refresh_cache_for(self, id: int):
-        config = await self.db.fetchrow("SELECT * FROM config WHERE id = $1", id)
-        self.cache.update({config["id"]: dict(config)})
+        """Re-reads a guild's config, prefer `cache.update` when writing"""
+        await self.cache.refresh(id)
+
+    async def on_shard_ready(self, shard_id: int):
+        if self.config.get("prefetch_config", False):
+            guild_ids = [g.id for g in self.guilds if g.shard_id == shard_id]
+            self.loop.create_task(self.cache.prefetch(guild_ids))
 
     async def on_error(self, event_method, *args, **kwargs):
         self._logger.error(f"An Error Occurred: \n {event_method}\n")
@@ -148,6 +255,20 @@ class HarleyBot(commands.AutoShardedBot):
             token or self.config["token"],
         )
 
+    async def close(self):
+        await self.notifier.close()
+        self.log_scheduler.close()
+        self.timers.close()
+
+        self.snapshot.writer.cancel()
+
+        try:
+            await self.snapshot.dump()
+        finally:
+            # A full disk shouldn't keep us from shutting down.
+            await self.events.close()
+            await super().close()
+
     async def on_ipc_ready(self):
         self._logger.info("IPC Ready.")
 
@@ -169,18 +290,24 @@ class HarleyBot(commands.AutoShardedBot):
 
 
 class HarleyContext(commands.Context):
+    _config: Optional[GuildConfig] = None
+
     @property
-    def cache(self):
-        return self.bot.cache[self.guild.id]
+    def cache(self) -> GuildConfig:
+        # Prefer the store's copy, it has any updates made during the command.
+        return self.bot.cache.get(self.guild.id, self._config)
 
     @property
     def db(self):
+        if self.bot.db is None:
+            raise DatabaseUnavailable()
+
         return self.bot.db
 
     @property
     def mapped_message(self) -> Optional[Message]:
         """Returns the mapped message to this ctx, if any."""
-        return self.bot.edit_mapping.get(self.message)
+        return self.bot.edit_mapping.get(self.message.id)
 
     async def refresh(self):
         await self.bot.refresh_cache_for(self.guild.id)
@@ -193,34 +320,34 @@ class HarleyContext(commands.Context):
 
     async def reply(self, content=None, **kwargs):
 
-        if self.bot.edit_mapping.get(self.message):
+        if self.bot.edit_mapping.get(self.message.id):
 
             if "embed" not in kwargs:
                 kwargs["embed"] = None  # why, this is literally the same as popping it
 
-            msg = self.bot.edit_mapping.get(self.message)
+            msg = self.bot.edit_mapping.get(self.message.id)
             await msg.edit(content=content, **kwargs)
             return msg
 
         msg = await super().reply(content=content, **kwargs)
 
-        self.bot.edit_mapping[self.message] = msg
+        self.bot.edit_mapping[self.message.id] = msg
 
         return msg
 
     async def send(self, content=None, **kwargs):
 
-        if self.bot.edit_mapping.get(self.message):
+        if self.bot.edit_mapping.get(self.message.id):
             if "embed" not in kwargs:
                 kwargs["embed"] = None
 
-            msg = self.bot.edit_mapping.get(self.message)
+            msg = self.bot.edit_mapping.get(self.message.id)
             await msg.edit(content=content, **kwargs)
             return msg
 
         msg = await super().send(content=content, **kwargs)
 
-        self.bot.edit_mapping[self.message] = msg
+        self.bot.edit_mapping[self.message.id] = msg
 
         return msg
 
@@ -243,16 +370,17 @@ class HarleyContext(commands.Context):
             await msg.add_reaction(reaction)
 
         try:
-            reaction, user = await self.bot.wait_for(
-                "reaction_add",
+            # Raw, the prompt may not be in discord.py's small message cache.
+            payload = await self.bot.wait_for(
+                "raw_reaction_add",
                 check=(
-                    lambda r, u: r.message.id == msg.id
-                    and u.id == self.author.id
-                    and str(r) in reactions
+                    lambda p: p.message_id == msg.id
+                    and p.user_id == self.author.id
+                    and str(p.emoji) in reactions
                 ),
                 timeout=30,
             )
-            return bool(reactions.index(str(reaction)))
+            return bool(reactions.index(str(payload.emoji)))
         except asyncio.TimeoutError:
             await self.reply(
                 embed=CustomEmbed(description="You did not react in time.")
@@ -0,0 +1,318 @@
+import asyncio
+import heapq
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.workers import WorkerPool
+
+# Timers expiring within this window of now are kept in memory.
+WINDOW = timedelta(hours=1)
+# Most timers loaded per window, the horizon shrinks to fit when it's hit.
+LOAD_LIMIT = 50_000
+
+
+def utc(when: datetime) -> datetime:
+    """Naive datetimes in this codebase are UTC, make them aware"""
+    return when.replace(tzinfo=timezone.utc) if when.tzinfo is None else when
+
+
+class Timer:
+    __slots__ = ("id", "event", "expires_at", "created_at", "data")
+
+    def __init__(
+        self,
+        id: int,
+        event: str,
+        expires_at: datetime,
+        created_at: datetime,
+        data: dict,
+    ):
+        self.id = id
+        self.event = event
+        self.expires_at = expires_at
+        self.created_at = created_at
+        self.data = data
+
+    @classmethod
+    def from_record(cls, record):
+        data = record["data"]
+
+        return cls(
+            record["id"],
+            record["event"],
+            record["expires_at"],
+            record["created_at"],
+            json.loads(data) if isinstance(data, str) else data,
+        )
+
+    def __lt__(self, other: "Timer") -> bool:
+        return (self.expires_at, self.id) < (other.expires_at, other.id)
+
+    def __repr__(self) -> str:
+        return f"<Timer id={self.id} event={self.event!r} expires_at={self.expires_at}>"
+
+
+class TimerManager:
+    """Durable timers, dispatched as `on_{event}_timer_complete(timer)`.
+
+    Timers live in the `timers` table. Everything expiring before the current
+    horizon is loaded into a min-heap, a page at a time, and a single task
+    sleeps until the earliest one.
+
+    Events with a reconciler are completed by it, and the row is only deleted
+    once it succeeds, so they run at least once. A failure is retried when a
+    later window loads the row again. Other events have their row deleted
+    before they're dispatched, so they fire at most once, and a crash
+    mid-handler loses them.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap: List[Timer] = []
+        self._known: Dict[int, Timer] = {}
+        self._horizon: datetime = datetime.min.replace(tzinfo=timezone.utc)
+        # (expires_at, id) of the last row of a full page, the next page follows it.
+        self._cursor: Optional[Tuple[datetime, int]] = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task = None
+        self._reconcilers: Dict[str, Tuple[Callable, Optional[Callable]]] = {}
+        self._logger = logging.getLogger("Timers")
+        self.fired = 0
+        self.reconciliations: Dict[str, WorkerPool] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def add_reconciler(
+        self,
+        event: str,
+        func: Callable[[Timer], Awaitable],
+        *,
+        finished: Optional[Callable[[List[Timer]], Awaitable]] = None,
+    ):
+        """Completes `event` timers with `func` instead of dispatching them.
+
+        Ones that expired while the bot was down are fetched at once on
+        startup and run through a WorkerPool, one guild at a time per worker.
+        `finished` gets the timers that succeeded, for batched cleanup.
+        """
+        self._reconcilers[event] = (func, finished)
+
+    async def _claim_overdue(self, event: str) -> List[Timer]:
+        records = await self.bot.db.fetch(
+            "SELECT * FROM timers WHERE event = $1 AND expires_at <= now()", event
+        )
+
+        timers = [Timer.from_record(record) for record in records]
+
+        # Keep the dispatcher from picking these up while they're worked on.
+        for timer in timers:
+            self._known[timer.id] = timer
+
+        return timers
+
+    async def _reconcile(self, event: str, timers: List[Timer]):
+        func, finished = self._reconcilers[event]
+        pool = self.reconciliations[event] = WorkerPool(name=f"Timers: {event}")
+        self._logger.info(f"Reconciling {len(timers)} overdue {event} timers.")
+
+        try:
+            done = await pool.run(timers, func, key=lambda t: t.data.get("guild_id"))
+
+            await self.bot.db.execute(
+                "DELETE FROM timers WHERE id = ANY($1::bigint[])",
+                [timer.id for timer in done],
+            )
+
+            if finished is not None:
+                await finished(done)
+        finally:
+            # Failures are left in the table, the dispatcher retries them.
+            for timer in timers:
+                self._known.pop(timer.id, None)
+
+            self._horizon = datetime.min.replace(tzinfo=timezone.utc)
+            self._cursor = None
+            self._wakeup.set()
+
+        self._logger.info(
+            f"Reconciled {pool.done} {event} timers in {pool.elapsed:.2f}s, "
+            f"{pool.failed} failed."
+        )
+
+    async def create(self, event: str, expires_at: datetime, **data) -> Timer:
+        record = await self.bot.db.fetchrow(
+            """
+            INSERT INTO timers(event, expires_at, data) VALUES($1, $2, $3)
+            RETURNING *
+            """,
+            event,
+            utc(expires_at),
+            json.dumps(data),
+        )
+
+        timer = Timer.from_record(record)
+
+        # Mid window, timers past the cursor come with their page. Pushing one
+        # early would keep the heap from emptying before the pages between.
+        if timer.expires_at < self._horizon and (
+            self._cursor is None or (timer.expires_at, timer.id) <= self._cursor
+        ):
+            self._push(timer)
+
+        return timer
+
+    async def cancel(self, event: str, **data) -> int:
+        """Deletes every `event` timer whose data contains `data`"""
+        records = await self.bot.db.fetch(
+            "DELETE FROM timers WHERE event = $1 AND data @> $2 RETURNING id",
+            event,
+            json.dumps(data),
+        )
+
+        for record in records:
+            # It stays in the heap, firing it finds the row gone and skips it.
+            self._known.pop(record["id"], None)
+
+        return len(records)
+
+    def _push(self, timer: Timer):
+        if timer.id in self._known:
+            return
+
+        self._known[timer.id] = timer
+        heapq.heappush(self._heap, timer)
+
+        if self._heap[0] is timer:
+            self._wakeup.set()
+
+    async def _load_window(self):
+        """Loads the next page of the window, or starts a new window"""
+        if self._cursor is None:
+            self._horizon = datetime.now(timezone.utc) + WINDOW
+            after = (datetime.min.replace(tzinfo=timezone.utc), 0)
+        else:
+            after = self._cursor
+
+        records = await self.bot.db.fetch(
+            """
+            SELECT * FROM timers
+            WHERE expires_at < $1 AND (expires_at, id) > ($2, $3)
+            ORDER BY expires_at, id
+            LIMIT $4
+            """,
+            self._horizon,
+            *after,
+            LOAD_LIMIT,
+        )
+
+        for record in records:
+            self._push(Timer.from_record(record))
+
+        if len(records) == LOAD_LIMIT:
+            # The rest comes a page at a time, once these are through.
+            self._cursor = (records[-1]["expires_at"], records[-1]["id"])
+        else:
+            self._cursor = None
+
+    async def _fire(self, timer: Timer):
+        if self._known.get(timer.id) is not timer:
+            # Cancelled, or claimed by a reconciliation.
+            return
+
+        if timer.event in self._reconcilers:
+            self.bot.loop.create_task(self._complete(timer))
+            return
+
+        self._known.pop(timer.id, None)
+
+        # Whoever deletes the row owns the timer, so it can only fire once.
+        claimed = await self.bot.db.fetchval(
+            "DELETE FROM timers WHERE id = $1 RETURNING id", timer.id
+        )
+
+        if claimed is None:
+            return
+
+        self.fired += 1
+        self.bot.dispatch(f"{timer.event}_timer_complete", timer)
+
+    async def _complete(self, timer: Timer):
+        func, finished = self._reconcilers[timer.event]
+
+        try:
+            await func(timer)
+
+            claimed = await self.bot.db.fetchval(
+                "DELETE FROM timers WHERE id = $1 RETURNING id", timer.id
+            )
+
+            if claimed is None:
+                # Cancelled while it ran, whatever cancelled it cleans up.
+                return
+
+            self.fired += 1
+
+            if finished is not None:
+                await finished([timer])
+
+            self.bot.dispatch(f"{timer.event}_timer_complete", timer)
+        except Exception:
+            self._logger.exception(f"{timer!r} failed, a later window retries it.")
+        finally:
+            self._known.pop(timer.id, None)
+
+    async def _sleep_until(self, when: datetime):
+        self._wakeup.clear()
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+
+        for event in self._reconcilers:
+            # Claimed before the first window loads so they can't fire twice.
+            if timers := await self._claim_overdue(event):
+                self.bot.loop.create_task(self._reconcile(event, timers))
+
+        while not self.bot.is_closed():
+            try:
+                now = datetime.now(timezone.utc)
+
+                if self._cursor is not None:
+                    # Everything loaded sorts before the cursor, so the next
+                    # page is only needed once they've all fired.
+                    if not self._heap:
+                        await self._load_window()
+                elif now >= self._horizon:
+                    await self._load_window()
+
+                if self._heap and self._heap[0].expires_at <= now:
+                    await self._fire(heapq.heappop(self._heap))
+                    continue
+
+                next_timer: Optional[Timer] = self._heap[0] if self._heap else None
+                await self._sleep_until(
+                    min(next_timer.expires_at, self._horizon)
+                    if next_timer is not None
+                    else self._horizon
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._logger.exception("Timer dispatch failed, retrying shortly.")
+                await asyncio.sleep(5)
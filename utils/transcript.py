@@ -0,0 +1,87 @@
+import functools
+import tempfile
+from datetime import datetime
+from typing import IO, Iterable, List, Sequence, Tuple
+
+import discord
+
+from utils.message_cache import CachedMessage
+
+# Discord's upload limit for unboosted guilds is 8 MiB, stay well under it.
+MAX_SIZE = 4 * 1024 * 1024
+# Transcripts are kept in memory up to this size, then spill over to disk.
+SPOOL_SIZE = 256 * 1024
+# Batches bigger than this are rendered in the executor.
+INLINE_LIMIT = 25
+TRUNCATED = "\n... transcript truncated, it was too big to upload.\n"
+
+# (message id, author, content, attachment count)
+_Row = Tuple[int, str, str, int]
+
+
+def _render(header: str, rows: Sequence[_Row], missing: int) -> IO[bytes]:
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    budget = MAX_SIZE - len(TRUNCATED)
+
+    def write(text: str) -> bool:
+        nonlocal budget
+        data = text.encode()
+
+        if len(data) > budget:
+            buffer.write(TRUNCATED.encode())
+            return False
+
+        budget -= len(data)
+        buffer.write(data)
+        return True
+
+    write(header)
+
+    for id, author, content, attachments in rows:
+        created: datetime = discord.utils.snowflake_time(id)
+        line = f"[{created:%Y-%m-%d %H:%M:%S}] {author}: {content}"
+
+        if attachments:
+            line += f" [{attachments} attachment(s)]"
+
+        if not write(line + "\n"):
+            break
+    else:
+        if missing:
+            write(f"\n{missing} message(s) were not cached.\n")
+
+    buffer.seek(0)
+    return buffer
+
+
+async def build_transcript(
+    bot,
+    guild: discord.Guild,
+    channel_id: int,
+    messages: Iterable[CachedMessage],
+    *,
+    total: int,
+    filename: str = "transcript.txt",
+) -> discord.File:
+    """Renders cached messages into a plain text transcript file.
+
+    Member lookups happen here, the rendering itself runs in the executor
+    once there are more than `INLINE_LIMIT` messages.
+    """
+    rows: List[_Row] = []
+
+    for message in sorted(messages, key=lambda m: m.id):
+        member = guild.get_member(message.author_id)
+        author = f"{member or 'Unknown'} [{message.author_id}]"
+        rows.append((message.id, author, message.content, message.attachments))
+
+    channel = guild.get_channel(channel_id)
+    header = f"{total} message(s) deleted in #{channel} [{channel_id}]\n\n"
+    render = functools.partial(_render, header, rows, total - len(rows))
+
+    if len(rows) > INLINE_LIMIT:
+        fp = await bot.loop.run_in_executor(None, render)
+    else:
+        fp = render()
+
+    return discord.File(fp, filename=filename)
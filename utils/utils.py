@@ -1,8 +1,6 @@
 import time
-from datetime import datetime
 
 import discord
-import mystbin
 
 from utils.enums import LoggingEnum
 
@@ -10,7 +8,6 @@ from utils.enums import LoggingEnum
 class Utilities:
     def __init__(self, bot):
         self.bot = bot
-        self.mystbin = mystbin.Client()
 
     async def hook(self, url) -> discord.Webhook:
         return discord.Webhook.from_url(
@@ -23,14 +20,10 @@ class Utilities:
         )
 
     async def paste(self, text, syntax=None) -> str:
-        url = await self.mystbin.post(text, syntax=syntax)
-        return url.url
+        return await self.bot.pastes.paste(text, syntax)
 
     def get_enum(self, id) -> LoggingEnum:
-        try:
-            return LoggingEnum(int(self.bot.cache[id].get("options", "0"), 2))
-        except (ValueError, TypeError):
-            return LoggingEnum.NONE
+        return self.bot.cache.get(id, self.bot.default_config).options
 
 
 TIME_TEMPLATE = "%b %d, %Y %I:%M %p"
@@ -42,17 +35,6 @@ def title_format(input: str):
     return input.title().replace("_", " ").replace("-", " ")
 
 
-async def get_audit(guild: discord.Guild, action: discord.AuditLogAction):
-    """Gets audit logs from a given action with a limit of 1"""
-    try:
-        log = (await guild.audit_logs(limit=1, action=action).flatten())[0]
-        if (log.created_at - datetime.utcnow()).total_seconds() > 3:
-            return None
-        return log
-    except (discord.Forbidden, IndexError):
-        return None
-
-
 class Timer:
     __slots__ = ("start_time", "end_time")
 
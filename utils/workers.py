@@ -0,0 +1,89 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+CONCURRENCY = 8
+
+
+class WorkerPool:
+    """Runs a job for each item with bounded concurrency.
+
+    Items that share a key run one after another, so work aimed at one guild
+    queues behind that guild's rate limit bucket instead of piling onto it,
+    while other guilds carry on. Progress is kept for status messages and
+    metrics.
+    """
+
+    def __init__(self, *, concurrency: int = CONCURRENCY, name: str = "Workers"):
+        self.concurrency = concurrency
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at: float = None
+        self.finished_at: float = None
+        self._logger = logging.getLogger(name)
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and self.finished_at is None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def stats(self) -> dict:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "running": self.running,
+            "elapsed": round(self.elapsed, 2),
+        }
+
+    async def run(
+        self,
+        items: Iterable[T],
+        func: Callable[[T], Awaitable],
+        *,
+        key: Callable[[T], Hashable] = lambda item: None,
+    ) -> List[T]:
+        """Runs `func` on every item and returns the items it succeeded for"""
+        groups: Dict[Hashable, List[T]] = collections.defaultdict(list)
+
+        for item in items:
+            groups[key(item)].append(item)
+
+        self.total += sum(len(group) for group in groups.values())
+        self.started_at = self.started_at or time.monotonic()
+        self.finished_at = None
+
+        succeeded: List[T] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_group(group: List[T]):
+            async with semaphore:
+                for item in group:
+                    try:
+                        await func(item)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        self.failed += 1
+                        self._logger.exception(f"Job for {item!r} failed")
+                    else:
+                        self.done += 1
+                        succeeded.append(item)
+
+        try:
+            await asyncio.gather(*(run_group(group) for group in groups.values()))
+        finally:
+            self.finished_at = time.monotonic()
+
+        return succeeded